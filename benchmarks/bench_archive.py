@@ -0,0 +1,68 @@
+""" Times archiving a month of observations, replaying it, and indexed reads against full scans.
+
+Run from the project root: PYTHONPATH=src python benchmarks/bench_archive.py --cities 50
+"""
+
+import argparse # Parse the city and day counts
+import contextlib # Keeps handler messages off stdout
+import os # Builds output paths
+import sys # Handler messages go to stderr
+import tempfile # Holds the archive and output
+import time # Times each step
+import dt_conversion # Preloaded so replay isn't charged for loading timezone data
+from archive import PayloadArchive # Code under test
+from handlers import CSVStreamOutput # Replay target
+from mock_server import MockOWMServer # Source of realistic OWM payloads
+
+def timed(label: str, func):
+    """Run func, print how long it took and return its result."""
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<32}{time.perf_counter() - start:8.2f}s")
+    return result
+
+def main():
+    """Archive observations every 10 minutes for each city, then read them back several ways."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    mock = MockOWMServer()
+    names = [f"City {i}" for i in range(args.cities)]
+    dt_conversion.warm_up()
+    with tempfile.TemporaryDirectory() as workdir:
+        archive_dir = os.path.join(workdir, "archive")
+
+        def write():
+            """Append every observation in time order, as polling would."""
+            with PayloadArchive(archive_dir) as archive:
+                for step in range(args.days * 144):
+                    for i, name in enumerate(names):
+                        payload = mock.weather_json(name, i)
+                        payload["dt"] = 1609459200 + step * 600
+                        archive.append(payload)
+                return len(archive)
+        count = timed("archive", write)
+        size = sum(os.path.getsize(os.path.join(archive_dir, f)) for f in os.listdir(archive_dir))
+        print(f"{count} payloads, {size / count:.0f} bytes each on disk (segments and index)")
+
+        with PayloadArchive(archive_dir) as archive:
+            def replay():
+                """Rebuild a CSV of everything."""
+                with contextlib.redirect_stdout(sys.stderr), \
+                        CSVStreamOutput(os.path.join(workdir, "replay.csv")) as handler:
+                    return archive.replay(handler)
+            replayed = timed("replay all to CSV", replay)
+            print(f"{replayed / count:.0%} replayed")
+            one_city = [names[0]]
+            week = (1609459200, 1609459200 + 7 * 86400)
+            indexed = timed("one city, one week (index)",
+                            lambda: len(list(archive.query(one_city, *week))))
+            scanned = timed("one city, one week (scan)",
+                            lambda: len(list(archive.scan(one_city, *week))))
+            assert indexed == scanned
+
+if __name__ == "__main__":
+    main()
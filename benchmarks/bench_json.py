@@ -0,0 +1,62 @@
+""" Compares JSON decoding of OWM responses and encoding of output records across backends.
+
+Run from the project root: PYTHONPATH=src python benchmarks/bench_json.py
+"""
+
+import argparse # Parse the iteration count
+import json # Standard library backend being compared against
+import timeit # Times each variant
+import requests # Builds responses like the ones the session returns
+import fast_json # Backend used by WeatherService and the handlers
+from mock_server import MockOWMServer # Source of realistic OWM payloads
+from records import WeatherRecord # Parsing step after decoding
+
+def make_response(body: bytes) -> requests.Response:
+    """Return a 200 response holding body, without a charset like the real API."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body # Where requests keeps a body it has already read
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+def per_call_us(func, number: int) -> float:
+    """Return the best of three runs of func in microseconds per call."""
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+def main():
+    """Print microseconds per call for each decode and encode variant."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=20_000)
+    number = parser.parse_args().number
+
+    payload = MockOWMServer().weather_json("Buenos Aires")
+    body = json.dumps(payload).encode()
+    group_body = json.dumps({"cnt": 20, "list": [payload] * 20}).encode() # One bulk response
+    record = {"city": "Buenos Aires", "temperature": 24.5, "humidity": 61,
+              "condition": "clear sky", "local_time": "01-Jan-21 09:00 PM -03"}
+
+    results = {
+        "decode response.json()": per_call_us(lambda: make_response(body).json(), number),
+        "decode json.loads(content)": per_call_us(
+            lambda: json.loads(make_response(body).content), number),
+        f"decode fast_json ({fast_json.backend()})": per_call_us(
+            lambda: fast_json.loads(make_response(body).content), number),
+        "decode + WeatherRecord, response.json()": per_call_us(
+            lambda: WeatherRecord.from_owm(make_response(body).json()), number),
+        f"decode + WeatherRecord, fast_json ({fast_json.backend()})": per_call_us(
+            lambda: WeatherRecord.from_owm(fast_json.loads(make_response(body).content)), number),
+        "decode group of 20, json.loads": per_call_us(lambda: json.loads(group_body), number // 10),
+        f"decode group of 20, fast_json ({fast_json.backend()})": per_call_us(
+            lambda: fast_json.loads(group_body), number // 10),
+        "encode json.dumps(indent=4)": per_call_us(lambda: json.dumps(record, indent=4), number),
+        "encode json.dumps()": per_call_us(lambda: json.dumps(record), number),
+        f"encode fast_json indent=None ({fast_json.backend()})": per_call_us(
+            lambda: fast_json.dumps(record), number)
+    }
+    width = max(len(name) for name in results)
+    for name, micros in results.items():
+        print(f"{name:<{width}}  {micros:8.2f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+""" Times multi-process conversion and writing of raw payloads for increasing process counts.
+
+Run from the project root: PYTHONPATH=src python benchmarks/bench_pipeline.py --records 1000000
+"""
+
+import argparse # Parse the record and process counts
+import os # Default process counts from the number of cores
+import tempfile # Holds the output files
+import time # Times each run
+from mock_server import MockOWMServer # Source of realistic OWM payloads
+from pipeline import process_payloads # Code under test
+
+def main():
+    """Print records per second for each process count and output format."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--processes", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--formats", nargs="+", choices=("csv", "jsonl"), default=["csv"])
+    args = parser.parse_args()
+
+    mock = MockOWMServer()
+    # A month of 10 minute observations per city, spread over the mock's locations
+    payloads = []
+    for i in range(args.records):
+        payload = mock.weather_json(f"City {i % 250}", i % 250)
+        payload["dt"] += (i // 250) * 600
+        payloads.append(payload)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for output_format in args.formats:
+            for processes in args.processes:
+                path = os.path.join(workdir, f"out.{output_format}")
+                start = time.perf_counter()
+                written, _ = process_payloads(payloads, path, output_format, processes)
+                elapsed = time.perf_counter() - start
+                print(f"{output_format} {processes:>3} processes: {elapsed:7.2f}s "
+                      f"{written / elapsed:>10,.0f} records/s")
+
+if __name__ == "__main__":
+    main()
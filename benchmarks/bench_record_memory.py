@@ -0,0 +1,61 @@
+""" Compares memory used per observation by dictionaries and WeatherRecords.
+
+Run from the project root: PYTHONPATH=src python benchmarks/bench_record_memory.py
+"""
+
+import argparse # Parse the record count
+import tracemalloc # Measures memory allocated while building the records
+from datetime import datetime, timezone # Formats the local time string held by the old dicts
+from records import WeatherRecord # Compact record type being measured
+
+CONDITIONS = ["clear sky", "few clouds", "scattered clouds", "light rain", "mist"]
+
+def owm_item(i: int) -> dict:
+    """Return a fake OWM weather object that varies with i."""
+    return {
+        "name": f"City{i % 250}", # Roughly one entry per capital city
+        "main": {"temp": 10 + (i % 300) / 10, "humidity": i % 100},
+        "weather": [{"id": 800 + i % 5, "description": CONDITIONS[i % 5]}],
+        "dt": 1609459200 + i * 600,
+        "coord": {"lat": (i % 180) - 90.5, "lon": (i % 360) - 180.5}
+    }
+
+def measure(build, items: list) -> int:
+    """Return the bytes still allocated after building one object per item."""
+
+    tracemalloc.start()
+    objects = [build(item) for item in items]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+def as_old_dict(item: dict) -> dict:
+    """Build the dictionary get_weather_data returned before WeatherRecord, local time included."""
+    return {
+        "city": item["name"],
+        "temperature": item["main"]["temp"],
+        "humidity": item["main"]["humidity"],
+        "condition": item["weather"][0]["description"],
+        # Same string format as convert_time, in UTC to keep timezone lookups out of the measurement
+        "local_time": datetime.fromtimestamp(item["dt"], tz=timezone.utc).strftime(
+            "%d-%b-%y %I:%M %p %Z")
+    }
+
+def main():
+    """Print bytes per record for both representations."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--records", type=int, default=100_000)
+    count = parser.parse_args().records
+    items = [owm_item(i) for i in range(count)]
+
+    dict_bytes = measure(as_old_dict, items)
+    record_bytes = measure(WeatherRecord.from_owm, items)
+    print(f"records: {count}")
+    print(f"dict bytes/record: {dict_bytes / count:.0f}")
+    print(f"WeatherRecord bytes/record: {record_bytes / count:.0f}")
+    print(f"saving: {1 - record_bytes / dict_bytes:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+""" End-to-end throughput benchmark of WeatherService and the output handlers against a local mock API.
+
+Run from the project root: PYTHONPATH=src python benchmarks/bench_throughput.py [--output results.json]
+"""
+
+import argparse # Parse benchmark settings
+import contextlib # Keeps handler messages out of the JSON written to stdout
+import json # Write machine-readable results
+import os # Build output paths
+import platform # Record the Python version alongside results
+import resource # Read peak RSS
+import statistics # Percentiles of request latency
+import sys # Print results to stdout
+import tempfile # Holds the files written by the output handlers
+import time # Time each run and request
+import dt_conversion # Preloaded so the first run isn't charged for loading timezone data
+import fast_json # Reported so runs with and without orjson can be compared
+from handlers import CSVStreamOutput, JSONLinesOutput # Output stage of the pipeline
+from mock_server import MockOWMServer # Local stand-in for the OWM API
+from weather_service import WeatherService # Code under test
+
+class TimedWeatherService(WeatherService):
+    """WeatherService that records how long each city's fetch took."""
+
+    def __init__(self, *args, **kwargs):
+        """Create the service with an empty list of latencies."""
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def fetch_weather(self, city: str) -> dict:
+        """Fetch and time one city, list.append is atomic so threads can share the list."""
+        start = time.perf_counter()
+        try:
+            return super().fetch_weather(city)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+def percentile(values: list, pct: int) -> float:
+    """Return the pct-th percentile of values in milliseconds."""
+    if len(values) < 2:
+        return values[0] * 1000 if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1] * 1000
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_case(server: MockOWMServer, cities: int, workers: int, sink: str, workdir: str) -> dict:
+    """Fetch and write cities through the full pipeline, returning the measurements."""
+
+    names = [f"city{i}" for i in range(cities)]
+    path = os.path.join(workdir, f"{cities}_{workers}_{sink}")
+    handler = CSVStreamOutput(path + ".csv") if sink == "csv" else JSONLinesOutput(path + ".jsonl")
+    # No retries so injected errors show up in the error count rather than as latency
+    with TimedWeatherService("BENCH", pool_size=workers, retries=0) as service:
+        service.url = server.weather_url
+        start = time.perf_counter()
+        results = service.get_weather_many(names, max_workers=workers)
+        with contextlib.redirect_stdout(sys.stderr), handler:
+            for result in results:
+                if result.data:
+                    handler.output(result.data)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "cities": cities,
+        "workers": workers,
+        "sink": sink,
+        "seconds": round(elapsed, 4),
+        "requests_per_sec": round(cities / elapsed, 1),
+        "errors": sum(1 for r in results if r.error),
+        "latency_ms": {
+            "p50": round(percentile(service.latencies, 50), 2),
+            "p95": round(percentile(service.latencies, 95), 2),
+            "p99": round(percentile(service.latencies, 99), 2)
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+def main():
+    """Run every combination of city count, concurrency and sink, printing JSON results."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cities", type=int, nargs="+", default=[50, 250])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--sinks", nargs="+", choices=("csv", "jsonl"), default=["csv", "jsonl"])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per mock response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--output", help="write results to this JSON file as well as stdout")
+    args = parser.parse_args()
+
+    dt_conversion.warm_up()
+    runs = []
+    with MockOWMServer(args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                       seed=0) as server, tempfile.TemporaryDirectory() as workdir:
+        for cities in args.cities:
+            for workers in args.workers:
+                for sink in args.sinks:
+                    runs.append(run_case(server, cities, workers, sink, workdir))
+                    print(f"{cities} cities, {workers} workers, {sink}: "
+                          f"{runs[-1]['requests_per_sec']} req/s", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "json_backend": fast_json.backend(),
+        "settings": {"latency": args.latency, "jitter": args.jitter,
+                     "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate},
+        "runs": runs
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+""" Append-only compressed archive of raw OWM responses with a city/time index, for replay offline. """
+
+import gzip # Compresses each block of payloads
+import os # Builds segment paths and checks their size
+import threading # Guards appends from worker threads
+import fast_json # Encodes payloads as JSON Lines
+from city_index import fold # Cities are indexed by their name and query with accents folded
+from records import WeatherRecord # Replayed payloads are output as records
+
+SEGMENT_BYTES = 64 * 1024 * 1024 # Start a new segment file once one reaches this size
+BLOCK_RECORDS = 256 # Payloads compressed together, more compress better but reads decompress more
+
+class PayloadArchive:
+    """Stores raw OWM weather objects in gzip segment files, indexed by city and dt in SQLite.
+
+    Each payload is indexed under its API name and, if given, the query that fetched
+    it, both folded like capital lookups, so "bogota" and "london,gb" find what they fetched.
+
+    Payloads are buffered and each block is written as its own gzip member, so every
+    segment is a normal .gz file of JSON Lines (zcat works) and an indexed read only
+    decompresses the blocks holding matching records. Files are only ever appended to.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES,
+                 block_records: int = BLOCK_RECORDS):
+        """Open (or create) the archive in directory."""
+        import sqlite3 # Used for the index, only imported when archiving or replaying
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self._pending = [] # (payload, query) pairs waiting to be written as a block
+        self._lock = threading.Lock()
+        # Shared between threads, access is serialised by the archive lock
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blocks (
+                id INTEGER PRIMARY KEY, segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL, length INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS records (
+                city TEXT NOT NULL, city_id INTEGER, dt INTEGER NOT NULL,
+                block INTEGER NOT NULL, line INTEGER NOT NULL, query TEXT);
+            CREATE INDEX IF NOT EXISTS records_city_dt ON records (city, dt);
+            CREATE INDEX IF NOT EXISTS records_dt ON records (dt);""")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(records)")]
+        if "query" not in columns: # Archive from before queries were indexed
+            self._conn.execute("ALTER TABLE records ADD COLUMN query TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_query_dt ON records (query, dt)")
+        self._conn.commit()
+        self._segment = self._conn.execute("SELECT MAX(segment) FROM blocks").fetchone()[0] or 1
+
+    def segment_path(self, segment: int) -> str:
+        """Return the path of a segment file."""
+        return os.path.join(self.directory, f"segment-{segment:05d}.jsonl.gz")
+
+    def append(self, payload: dict, query: str = None):
+        """Add one raw OWM weather object (and its query), written once a block's worth are buffered."""
+        with self._lock:
+            self._pending.append((payload, query))
+            if len(self._pending) >= self.block_records:
+                self._write_block()
+
+    def flush(self):
+        """Write any buffered payloads as a (possibly short) block."""
+        with self._lock:
+            self._write_block()
+
+    def _write_block(self):
+        """Compress the buffered payloads, append them to the segment and index them."""
+
+        if not self._pending:
+            return
+        data = "".join(fast_json.dumps(payload) + "\n" for payload, _ in self._pending).encode()
+        member = gzip.compress(data, mtime=0)
+        path = self.segment_path(self._segment)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset and offset + len(member) > self.segment_bytes: # Keep segments a manageable size
+            self._segment += 1
+            path, offset = self.segment_path(self._segment), 0
+        with open(path, "ab") as f:
+            f.write(member)
+        # The data is written before it's indexed, so a crash never indexes a missing block
+        block = self._conn.execute("INSERT INTO blocks (segment, offset, length) VALUES (?, ?, ?)",
+                                   (self._segment, offset, len(member))).lastrowid
+        self._conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)", [
+            (fold(payload.get("name", "")), payload.get("id"), payload.get("dt", 0), block, line,
+             fold(query) if query else None)
+            for line, (payload, query) in enumerate(self._pending)])
+        self._conn.commit()
+        self._pending = []
+
+    def __len__(self):
+        """Return the number of archived payloads, including buffered ones."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0] \
+                + len(self._pending)
+
+    def query(self, cities: list = None, start: int = None, end: int = None):
+        """Yield archived payloads for the cities (any if None) with start <= dt < end.
+
+        Cities match the API name or the query a payload was fetched with. Uses the index
+        to decompress only blocks holding matches, yielding payloads in the order they
+        were archived.
+        """
+
+        conditions, params = [], []
+        if cities:
+            keys = [fold(city) for city in cities]
+            marks = ",".join("?" * len(keys))
+            conditions.append(f"(r.city IN ({marks}) OR r.query IN ({marks}))")
+            params.extend(keys + keys)
+        if start is not None:
+            conditions.append("r.dt >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("r.dt < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            self._write_block() # Include anything still buffered
+            rows = self._conn.execute(f"""
+                SELECT b.id, b.segment, b.offset, b.length, r.line
+                FROM records r JOIN blocks b ON b.id = r.block {where}
+                ORDER BY b.id, r.line""", params).fetchall()
+
+        block_lines, current, handle = None, None, None
+        try:
+            for block, segment, offset, length, line in rows:
+                if block != current: # Read and decompress each needed block once
+                    if handle is None or handle.name != self.segment_path(segment):
+                        if handle:
+                            handle.close()
+                        handle = open(self.segment_path(segment), "rb")
+                    handle.seek(offset)
+                    block_lines = gzip.decompress(handle.read(length)).splitlines()
+                    current = block
+                yield fast_json.loads(block_lines[line])
+        finally:
+            if handle:
+                handle.close()
+
+    def scan(self, cities: list = None, start: int = None, end: int = None):
+        """Yield matching payloads by decompressing every segment, without using the index.
+
+        Segments only hold the payloads, so cities are matched by API name alone.
+        """
+
+        keys = {fold(city) for city in cities} if cities else None
+        self.flush()
+        segment = 1
+        while os.path.exists(self.segment_path(segment)):
+            with gzip.open(self.segment_path(segment), "rb") as f:
+                for line in f:
+                    payload = fast_json.loads(line)
+                    dt = payload.get("dt", 0)
+                    if (keys is None or fold(payload.get("name", "")) in keys) \
+                            and (start is None or dt >= start) and (end is None or dt < end):
+                        yield payload
+            segment += 1
+
+    def replay(self, handler: "DataOutput", cities: list = None, start: int = None,
+               end: int = None) -> int:
+        """Output matching archived payloads through handler without the API, returning the count."""
+
+        count = 0
+        for payload in self.query(cities, start, end):
+            try:
+                record = WeatherRecord.from_owm(payload)
+            except (KeyError, IndexError): # Archived error responses have no weather to output
+                continue
+            handler.output(record)
+            count += 1
+        return count
+
+    def close(self):
+        """Write buffered payloads and close the index."""
+        with self._lock:
+            self._write_block()
+            self._conn.close()
+
+    def __enter__(self):
+        """Allow the archive to be used as a context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the archive when leaving the with block."""
+        self.close()
@@ -0,0 +1,158 @@
+""" Defines TTL caches for weather responses, stored in memory or in an SQLite file. """
+
+import fast_json # Used to serialise cached weather data for SQLite
+import re # Used to normalise city queries
+import threading # Used to make the caches safe to share between threads
+import time # Used to timestamp and expire cache entries
+from abc import ABC, abstractmethod # Creates abstract base classes for structure and method definitions
+from collections import OrderedDict # Keeps memory cache entries in least recently used order
+
+DEFAULT_TTL = 600 # OpenWeatherMap updates roughly every 10 minutes
+DEFAULT_MAX_ENTRIES = 1024 # Entries kept before the least recently used are evicted
+
+def normalize_query(city: str) -> str:
+    """Lowercase the city query and collapse spaces and commas so equivalent queries share a key."""
+    return ",".join(part for part in re.split(r"[\s,]+", city.lower()) if part)
+
+class ResponseCache(ABC):
+    """Abstract base class for weather response caches with TTL expiry and LRU eviction."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Set the expiry time, size limit and statistics counters."""
+        self.ttl = ttl # Seconds an entry stays fresh
+        self.max_entries = max_entries # Maximum entries before evicting the least recently used
+        self.hits = 0 # Fresh entries returned
+        self.misses = 0 # Keys that weren't cached at all
+        self.stale = 0 # Keys found but older than the TTL
+        self._lock = threading.Lock() # Guards the entries and counters
+
+    def get(self, city: str):
+        """Return the cached data for the city, or None if it is missing or stale."""
+
+        key = normalize_query(city)
+        now = time.time()
+        with self._lock:
+            entry = self._load(key, now) # (stored_at, data) or None
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, data = entry
+            if now - stored_at > self.ttl: # Expired, drop it so the caller refetches
+                self.stale += 1
+                self._delete(key)
+                return None
+            self.hits += 1
+            return data
+
+    def set(self, city: str, data: dict):
+        """Store data for the city, evicting the least recently used entries if over the limit."""
+        with self._lock:
+            self._store(normalize_query(city), data, time.time())
+
+    def stats(self) -> dict:
+        """Return hit, miss and stale counts along with the current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale,
+                    "size": self._size()}
+
+    def close(self):
+        """Release any resources held by the cache."""
+
+    @abstractmethod
+    def _load(self, key: str, now: float):
+        """Return (stored_at, data) for the key and mark it recently used, or None."""
+
+    @abstractmethod
+    def _store(self, key: str, data: dict, now: float):
+        """Store the entry and evict down to max_entries."""
+
+    @abstractmethod
+    def _delete(self, key: str):
+        """Remove the entry for the key."""
+
+    @abstractmethod
+    def _size(self) -> int:
+        """Return the number of entries held."""
+
+
+class MemoryCache(ResponseCache):
+    """Keeps cached responses in an in-process dictionary."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Create the ordered dictionary that holds entries, oldest use first."""
+        super().__init__(ttl, max_entries)
+        self._entries = OrderedDict()
+
+    def _load(self, key, now):
+        """Return the entry and move it to the most recently used end."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key) # Mark as most recently used
+        return entry
+
+    def _store(self, key, data, now):
+        """Store the entry and pop the oldest entries while over the limit."""
+        self._entries[key] = (now, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries: # Evict least recently used first
+            self._entries.popitem(last=False)
+
+    def _delete(self, key):
+        """Remove the entry if present."""
+        self._entries.pop(key, None)
+
+    def _size(self):
+        """Return the number of entries held."""
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """Keeps cached responses in an SQLite file so they survive a restart."""
+
+    def __init__(self, filename="weather_cache.db", ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Open (or create) the cache database."""
+        import sqlite3 # Used for the on-disk cache backend, only imported when needed
+        super().__init__(ttl, max_entries)
+        self.filename = filename
+        # Shared between threads, access is serialised by the cache lock
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY, data TEXT NOT NULL,
+            stored_at REAL NOT NULL, used_at REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used_at)")
+        self._conn.commit()
+
+    def _load(self, key, now):
+        """Return the entry and record when it was last used."""
+        row = self._conn.execute(
+            "SELECT stored_at, data FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE cache SET used_at = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return row[0], fast_json.loads(row[1])
+
+    def _store(self, key, data, now):
+        """Upsert the entry and delete the least recently used rows over the limit."""
+        self._conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                           (key, fast_json.dumps(data), now, now))
+        # Evict least recently used entries beyond the limit
+        self._conn.execute("""DELETE FROM cache WHERE key IN (
+            SELECT key FROM cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)""",
+                           (self.max_entries,))
+        self._conn.commit()
+
+    def _delete(self, key):
+        """Delete the entry's row."""
+        self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def _size(self):
+        """Count the rows in the cache table."""
+        return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,212 @@
+""" Resolves city queries to OpenWeatherMap city IDs or coordinates using local city lists. """
+
+import bisect # Prefix search over the sorted capital names
+import csv # Reads the capital city source list
+import gzip # Used to read OWM's compressed city list
+import json # Used to read the city list and store the compact index
+import mmap # Maps the bundled capital index instead of reading and parsing it
+import os # Locates the bundled data
+import struct # Packs capital records into fixed size binary rows
+import sys # Used to read paths when building the index from the command line
+import unicodedata # Folds accents so "bogota" finds "Bogotá"
+from typing import NamedTuple # Used to define the capital city type
+from cache import normalize_query # Normalises queries the same way as the response cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CAPITALS_PATH = os.path.join(DATA_DIR, "capitals.bin") # Built from data/capitals.csv
+
+class CityIndex:
+    """Maps normalised city queries ("london", "london,gb", "melbourne,vic,au") to OWM IDs."""
+
+    def __init__(self, ids: dict = None):
+        """Create the index from a {normalised query: city id} dictionary."""
+        self.ids = ids or {}
+
+    @classmethod
+    def from_city_list(cls, path) -> "CityIndex":
+        """Build the index from OWM's city.list.json (or .json.gz) bulk download.
+
+        Queries that match more than one city are left out so they fall back to a name lookup.
+        """
+
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            cities = json.load(f)
+
+        ids, ambiguous = {}, set()
+        for city in cities:
+            name, country, state = city["name"], city.get("country", ""), city.get("state", "")
+            # Every way the user could type the city: name, name + country, name + state + country
+            for query in {name, f"{name} {country}", f"{name} {state} {country}"}:
+                key = normalize_query(query)
+                if key in ids and ids[key] != city["id"]: # Same query, different city
+                    ambiguous.add(key)
+                ids[key] = city["id"]
+        for key in ambiguous:
+            del ids[key]
+        return cls(ids)
+
+    @classmethod
+    def load(cls, path) -> "CityIndex":
+        """Load an index previously written with save."""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        """Write the index to a compact JSON file so it doesn't need rebuilding."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.ids, f, separators=(",", ":"))
+
+    def resolve(self, city: str):
+        """Return the OWM city ID for the query, or None if it isn't known or is ambiguous."""
+        return self.ids.get(normalize_query(city))
+
+    def __len__(self):
+        """Return the number of queries in the index."""
+        return len(self.ids)
+
+def fold(text: str) -> str:
+    """Normalise a query for capital lookups, also dropping accents and punctuation."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return normalize_query(text.replace("'", "").replace("-", " ").replace(".", " "))
+
+class Capital(NamedTuple):
+    """One capital city, id is None where the OWM city ID isn't known."""
+    name: str # Display name, e.g. "Bogotá"
+    country: str # ISO 3166 alpha-2 country code
+    state: str # US state code, empty elsewhere
+    lat: float # Latitude
+    lon: float # Longitude
+    id: int | None # OWM city ID if known, otherwise look up by coordinates
+
+class CapitalIndex:
+    """Bundled capital cities, memory mapped from a compact binary file.
+
+    The file is a header, fixed size rows sorted by folded name, then a pool of UTF-8
+    strings. Only the sorted names are decoded on load, rows are unpacked on demand.
+    """
+
+    MAGIC = b"CAPI"
+    HEADER = struct.Struct("<4sHI") # Magic, format version, number of rows
+    # lat, lon, id (-1 if unknown), then (offset, length) of key, name and state, and country
+    ROW = struct.Struct("<ffiIHIHIH2s")
+
+    def __init__(self, path=CAPITALS_PATH):
+        """Map the index file and decode the sorted names used for lookups."""
+
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, count = self.HEADER.unpack_from(self._map)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} is not a capital city index")
+        self._rows = self.HEADER.size # Offset of the first row
+        self.keys = [self._string(*self._row(i)[3:5]) for i in range(count)] # Sorted folded names
+        self.aliases = {} # Every accepted query ("paris", "paris,fr") to its row
+        for i, key in enumerate(self.keys):
+            capital = self[i]
+            for alias in (key, f"{key},{capital.country.lower()}",
+                          f"{key},{capital.state.lower()},{capital.country.lower()}"):
+                self.aliases.setdefault(normalize_query(alias), i)
+
+    def _row(self, i: int) -> tuple:
+        """Unpack row i."""
+        return self.ROW.unpack_from(self._map, self._rows + i * self.ROW.size)
+
+    def _string(self, offset: int, length: int) -> str:
+        """Decode a string from the pool."""
+        return self._map[offset:offset + length].decode()
+
+    def __getitem__(self, i: int) -> Capital:
+        """Return the capital in row i."""
+        lat, lon, city_id, _, _, name_off, name_len, state_off, state_len, country = self._row(i)
+        return Capital(self._string(name_off, name_len), country.decode(),
+                       self._string(state_off, state_len), round(lat, 4), round(lon, 4),
+                       None if city_id < 0 else city_id)
+
+    def __len__(self):
+        """Return the number of capitals."""
+        return len(self.keys)
+
+    def resolve(self, query: str):
+        """Return the Capital for "name", "name,country" or "name,state,country", or None."""
+        i = self.aliases.get(fold(query))
+        return None if i is None else self[i]
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        """Return up to limit capitals whose name starts with prefix, in name order."""
+
+        prefix = fold(prefix)
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", start) # Past the last match
+        return [self[i] for i in range(start, min(end, start + limit))]
+
+    def suggest(self, query: str, limit: int = 3, cutoff: float = 0.8) -> list:
+        """Return capitals with names close to the query, best first, for likely typos."""
+
+        import difflib # Only needed when a query isn't found
+        key = fold(query)
+        # Compare names of similar length only, a typo changes a name by a letter or two
+        candidates = [k for k in self.keys if abs(len(k) - len(key)) <= 2]
+        matches = difflib.get_close_matches(key, candidates, limit, cutoff)
+        return [self[bisect.bisect_left(self.keys, match)] for match in matches]
+
+    def lookup(self, query: str) -> tuple:
+        """Return (capital, suggestions): the capital if the query is one, otherwise near misses.
+
+        No suggestions are made if the name is a capital's but the country or state
+        differs, e.g. "paris,us" is a real city and not a misspelling of Paris.
+        """
+
+        capital = self.resolve(query)
+        if capital is not None:
+            return capital, []
+        name = fold(query).split(",")
+        for words in range(len(name), 0, -1): # Drop state and country parts from the end
+            if ",".join(name[:words]) in self.aliases:
+                return None, []
+        return None, self.suggest(query)
+
+    def close(self):
+        """Unmap the index file."""
+        self._map.close()
+
+    @classmethod
+    def build(cls, capitals: list) -> bytes:
+        """Return the binary index for a list of Capitals."""
+
+        capitals = sorted(capitals, key=lambda c: fold(c.name))
+        pool = bytearray()
+        pool_start = cls.HEADER.size + len(capitals) * cls.ROW.size
+
+        def add(text: str) -> tuple:
+            """Append text to the string pool, returning its (offset, length)."""
+            data = text.encode()
+            pool.extend(data)
+            return pool_start + len(pool) - len(data), len(data)
+
+        rows = b"".join(
+            cls.ROW.pack(c.lat, c.lon, -1 if c.id is None else c.id, *add(fold(c.name)),
+                         *add(c.name), *add(c.state), c.country.encode())
+            for c in capitals)
+        return cls.HEADER.pack(cls.MAGIC, 1, len(capitals)) + rows + bytes(pool)
+
+def read_capitals(path) -> list:
+    """Read Capitals from a CSV with name, country, state, lat, lon and id columns."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [Capital(row["name"], row["country"], row["state"], float(row["lat"]),
+                        float(row["lon"]), int(row["id"]) if row["id"] else None)
+                for row in csv.DictReader(f)]
+
+if __name__ == "__main__":
+    # Build the index once: python src/city_index.py city.list.json.gz city_index.json
+    # Rebuild the bundled capitals: python src/city_index.py --capitals src/data/capitals.csv
+    if len(sys.argv) == 3 and sys.argv[1] == "--capitals":
+        with open(CAPITALS_PATH, "wb") as out:
+            out.write(CapitalIndex.build(read_capitals(sys.argv[2])))
+        print(f"Saved capital index to {CAPITALS_PATH}")
+        sys.exit()
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python src/city_index.py <city.list.json[.gz]> <index.json>")
+    built = CityIndex.from_city_list(sys.argv[1])
+    built.save(sys.argv[2])
+    print(f"Saved {len(built)} city queries to {sys.argv[2]}")
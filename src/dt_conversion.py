@@ -1,35 +1,218 @@
 """ Converts raw unix timestamp to local timezone aware datetime """
 
-from datetime import datetime # Used to format the date and time
-import pytz # Used to handle timezone conversions
-from timezonefinder import TimezoneFinder # Used to find timezone based on latitude and longitude
+import os # Used to recognise paths passed to use_timezone_grid
+import threading # Used to guard creation of the shared TimezoneFinder
+from datetime import datetime, timezone # Used to format the date and time
+from functools import lru_cache # Used to cache timezone lookups and pytz zone objects
+from instrumentation import instrumentation # Optional per-stage timing
 
+# pytz, timezonefinder, numpy and tz_grid (h3) are imported inside the functions that use them,
+# so importing this module costs nothing until the first conversion
+
+TZ_CACHE_SIZE = 4096 # Maximum number of rounded coordinates kept in the timezone cache
+COORD_PRECISION = 4 # Decimal places coordinates are rounded to (~11m) before caching
+
+_finder = None # Shared TimezoneFinder instance, created on first use
+_finder_lock = threading.Lock() # Ensures only one thread builds the TimezoneFinder
+# TimezoneFinder seeks and reads shared file handles, so only one thread may query it at a time
+_lookup_lock = threading.Lock()
+_grid = None # Optional precomputed TimezoneGrid, set with use_timezone_grid
+
+def get_finder() -> "TimezoneFinder":
+    """Return the process-wide TimezoneFinder, creating it on first use."""
+
+    global _finder # Module level so every caller shares one instance
+    if _finder is None: # Skip the lock entirely once the finder exists
+        with _finder_lock:
+            if _finder is None: # Re-check in case another thread created it while we waited
+                # Used to find timezone based on latitude and longitude
+                from timezonefinder import TimezoneFinder
+                _finder = TimezoneFinder() # Loading the polygon data is the expensive part
+    return _finder
+
+def reset_finder():
+    """Drop the finder and cached lookups so the next lookup opens its own, e.g. after a fork.
+
+    A forked process inherits the parent's finder with its open file handles and positions,
+    which the two processes would then move under each other.
+    """
+
+    global _finder, _finder_lock, _lookup_lock
+    _finder = None
+    _finder_lock, _lookup_lock = threading.Lock(), threading.Lock() # Could be held mid-fork
+    _lookup_timezone.cache_clear()
+
+def warm_up():
+    """Import the timezone libraries and load the TimezoneFinder data ahead of the first lookup.
+
+    Safe to run in a background thread while the user is still at a prompt.
+    """
+
+    get_finder()
+    get_pytz_zone("UTC")
+
+def use_timezone_grid(grid):
+    """Answer lookups from a TimezoneGrid (or the path of a saved one) before TimezoneFinder.
+
+    Pass None to stop using a grid. Clears the timezone cache so the change takes effect.
+    """
+
+    global _grid # Module level so every lookup sees the same grid
+    from tz_grid import TimezoneGrid # Precomputed cell to timezone table, needs h3 and numpy
+    _grid = TimezoneGrid.load(grid) if isinstance(grid, (str, os.PathLike)) else grid
+    _lookup_timezone.cache_clear()
+
+@lru_cache(maxsize=TZ_CACHE_SIZE)
+def _lookup_timezone(lat: float, lon: float) -> str:
+    """Look up the timezone name for rounded coordinates, cached by lru_cache."""
+
+    timezone_name = _grid.lookup(lat, lon) if _grid else None # Constant time cell lookup
+    if not timezone_name: # No grid, or the cell crosses a border, so search the polygons
+        finder = get_finder()
+        with _lookup_lock:
+            timezone_name = finder.timezone_at(lat=lat, lng=lon)
+    # If timezone isn't found, raise an error as timezone_name will be None (errors aren't cached)
+    if not timezone_name: # If timezone_name is None, it means the coordinates are invalid
+        raise ValueError("Coordinates do not correspond to a valid timezone.")
+    import pytz # timezonefinder's data can be newer than pytz's, e.g. America/Coyhaique
+    if timezone_name not in pytz.all_timezones_set:
+        raise ValueError(f"Timezone {timezone_name} is not known to pytz.")
+    return timezone_name
+
+@lru_cache(maxsize=None)
+def get_pytz_zone(timezone_name: str) -> "pytz.BaseTzInfo":
+    """Return the pytz timezone object for a name, cached as there are only ~600 zones."""
+    import pytz # Used to handle timezone conversions
+    return pytz.timezone(timezone_name)
+
+def timezone_cache_info() -> dict:
+    """Return hit/miss counters and sizes for the timezone and pytz zone caches."""
+
+    tz_info = _lookup_timezone.cache_info() # Named tuple of hits, misses, maxsize, currsize
+    zone_info = get_pytz_zone.cache_info()
+    return {
+        "timezone": tz_info._asdict(), # Coordinate to timezone name lookups
+        "zone": zone_info._asdict() # Timezone name to pytz zone objects
+    }
+
+def clear_timezone_cache():
+    """Empty both caches and reset their counters."""
+    _lookup_timezone.cache_clear()
+    get_pytz_zone.cache_clear()
+
+@instrumentation.timed("get_timezone")
 def get_timezone(coords: dict) -> str:
     """Get the timezone name based on latitude and longitude."""
 
-    try: # Create a TimezoneFinder instance
+    try:
         # Check if the coordinates dictionary contains "lat" and "lon" keys
         if "lat" not in coords or "lon" not in coords:
             raise ValueError("Coordinates must contain 'lat' and 'lon' keys.")
-        # Get the timezone name from latitude and longitude
-        timezone_name = TimezoneFinder().timezone_at(lat=coords["lat"], lng=coords["lon"])
-        # If timezone isn't found, raise an error as timezone_name will be None
-        if not timezone_name: # If timezone_name is None, it means the coordinates are invalid
-            raise ValueError("Coordinates do not correspond to a valid timezone.")
-        return timezone_name
+        # Round coordinates so nearby lookups for the same city share a cache entry
+        lat = round(float(coords["lat"]), COORD_PRECISION)
+        lon = round(float(coords["lon"]), COORD_PRECISION)
+        return _lookup_timezone(lat, lon) # Get the timezone name from latitude and longitude
     except ValueError as e:
         # Handle any exceptions that occur during timezone lookup, revert to UTC
         print(f"Error getting timezone: {e}, reverting to UTC.")
         return "UTC"
 
+@instrumentation.timed("convert_time")
 def convert_time(unix_dt: int, coords: dict) -> str:
     """Convert Unix timestamp to local time in the specified timezone."""
 
     # Convert naive timestamp to (UTC) timezone aware datetime object
-    utc_dt = datetime.fromtimestamp(unix_dt, tz=pytz.utc)
+    utc_dt = datetime.fromtimestamp(unix_dt, tz=timezone.utc)
     # Create local timezone object from the city coordinates using get_timezone function
-    local_tz = pytz.timezone(get_timezone(coords))
+    local_tz = get_pytz_zone(get_timezone(coords))
     # Convert UTC datetime to local timezone
     local_dt = utc_dt.astimezone(local_tz)
     # Return formatted local datetime as a string
     return local_dt.strftime("%d-%b-%y %I:%M %p %Z")
+
+@lru_cache(maxsize=None)
+def _format_tables() -> tuple:
+    """Lookup tables used to build "%d-%b-%y %I:%M %p" strings without calling strftime per row."""
+    import numpy as np # Used for vectorized batch conversion
+    two_digits = np.array([f"{i:02d}" for i in range(100)])
+    months = np.array(["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                       "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
+    return two_digits, months
+
+_EPOCH = datetime(1970, 1, 1) # Naive epoch used to turn pytz transition times into seconds
+
+@lru_cache(maxsize=None)
+def _zone_transitions(timezone_name: str) -> tuple:
+    """Return (transition seconds, utc offsets, abbreviations) arrays for a timezone."""
+
+    import numpy as np
+    zone = get_pytz_zone(timezone_name)
+    if not hasattr(zone, "_utc_transition_times"): # UTC and fixed offset zones never change
+        offset = zone.utcoffset(None).total_seconds()
+        return np.array([np.iinfo(np.int64).min]), np.array([offset], dtype=np.int64), \
+            np.array([zone.tzname(None)])
+    # Same data pytz's fromutc bisects over, converted to numpy arrays once per zone
+    starts = np.array([int((t - _EPOCH).total_seconds()) for t in zone._utc_transition_times],
+                      dtype=np.int64)
+    offsets = np.array([int(info[0].total_seconds()) for info in zone._transition_info],
+                       dtype=np.int64)
+    names = np.array([info[2] for info in zone._transition_info])
+    return starts, offsets, names
+
+def _format_local(unix_dts: "np.ndarray", timezone_name: str) -> "np.ndarray":
+    """Format timestamps sharing one timezone in a single vectorized pass."""
+
+    import numpy as np
+    two_digits, month_names = _format_tables()
+    starts, offsets, names = _zone_transitions(timezone_name)
+    # Index of the transition in effect for each timestamp, matching pytz's bisect_right - 1
+    idx = np.maximum(np.searchsorted(starts, unix_dts, side="right") - 1, 0)
+    local = (unix_dts + offsets[idx]).astype("datetime64[s]").astype("datetime64[m]")
+    days = local.astype("datetime64[D]")
+    months = local.astype("datetime64[M]")
+    years = local.astype("datetime64[Y]")
+    day = (days - months).astype(np.int64) + 1 # Day of month, 1 based
+    month = (months - years).astype(np.int64) # Month of year, 0 based for the lookup table
+    year = (years.astype(np.int64) + 1970) % 100 # Two digit year
+    minute_of_day = (local - days).astype(np.int64)
+    hour = minute_of_day // 60
+    hour12 = (hour + 11) % 12 + 1 # Convert 0-23 to 12, 1-11, 12, 1-11
+    parts = (
+        two_digits[day], "-", month_names[month], "-", two_digits[year], " ",
+        two_digits[hour12], ":", two_digits[minute_of_day % 60], " ",
+        np.where(hour < 12, "AM", "PM"), " ", names[idx]
+    )
+    result = parts[0]
+    for part in parts[1:]: # Join the columns element-wise
+        result = np.char.add(result, part)
+    return result
+
+def convert_times_batch(unix_dts, coords) -> list:
+    """Convert many Unix timestamps to local time strings, one timezone group at a time.
+
+    coords is either a sequence of {"lat", "lon"} dicts or an (N, 2) array of lat, lon pairs.
+    Returns strings in the same format and order as calling convert_time on each row.
+    """
+
+    import numpy as np
+    unix_dts = np.floor(np.asarray(unix_dts, dtype=np.float64)).astype(np.int64)
+    if len(coords) and isinstance(coords[0], dict): # Pull lat/lon out of OWM style dicts
+        coords = [(c["lat"], c["lon"]) for c in coords]
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) != len(unix_dts):
+        raise ValueError("unix_dts and coords must be the same length.")
+    if not len(unix_dts): # Nothing to convert
+        return []
+
+    # Resolve each distinct (rounded) coordinate once, then map rows to timezone groups
+    unique_coords, coord_idx = np.unique(
+        np.round(coords, COORD_PRECISION), axis=0, return_inverse=True)
+    zone_names = [get_timezone({"lat": lat, "lon": lon}) for lat, lon in unique_coords]
+    group_names, zone_idx = np.unique(zone_names, return_inverse=True)
+    row_groups = zone_idx[coord_idx.ravel()]
+
+    result = np.empty(len(unix_dts), dtype=object)
+    for group, timezone_name in enumerate(group_names): # One vectorized pass per timezone
+        mask = row_groups == group
+        result[mask] = _format_local(unix_dts[mask], str(timezone_name))
+    return result.tolist()
@@ -0,0 +1,37 @@
+""" JSON encoding and decoding through orjson when it's installed, otherwise the standard library. """
+
+import json # Fallback backend, and the source of JSONDecodeError
+from functools import lru_cache # Looks for orjson once, on first use
+
+JSONDecodeError = json.JSONDecodeError # orjson's decode error is a subclass, so one except works
+
+@lru_cache(maxsize=None)
+def _orjson():
+    """Return the orjson module, or None if it isn't installed (imported here to start faster)."""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+def backend() -> str:
+    """Return the name of the backend in use, "orjson" or "json"."""
+    return "orjson" if _orjson() else "json"
+
+def loads(data):
+    """Decode JSON from bytes or a string, raising JSONDecodeError if it's invalid."""
+    fast = _orjson()
+    return fast.loads(data) if fast else json.loads(data)
+
+def dumps(obj, indent: int = None) -> str:
+    """Encode obj as a JSON string, compact unless indent is given.
+
+    orjson only indents by 2, other indents use the standard library. Both backends
+    write non-ASCII characters as is, so output is the same whichever is installed.
+    """
+
+    fast = _orjson()
+    if fast and indent in (None, 2):
+        return fast.dumps(obj, option=fast.OPT_INDENT_2 if indent else 0).decode()
+    separators = (",", ":") if indent is None else (",", ": ") # Match orjson's spacing
+    return json.dumps(obj, indent=indent, separators=separators, ensure_ascii=False)
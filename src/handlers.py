@@ -1,8 +1,13 @@
 """ This module defines classes for outputting weather data to terminal, CSV, and JSON."""
 
-import json # Used to handle JSON data
+import functools # Used to wrap each handler's output method for timing
+import fast_json # Encodes JSON with orjson when installed, otherwise the json module
 from abc import ABC, abstractmethod # Creates abstract base classes for structure and method definitions
 import csv # Used to handle CSV data
+import queue # Bounded queue between the fetch loop and the writer thread
+import threading # Runs the fan-out writer in the background
+from instrumentation import instrumentation # Optional per-stage timing
+from records import as_dict # Accept WeatherRecords as well as dictionaries
 
 class DataOutput(ABC):
     """Abstract base class for weather data output."""
@@ -11,9 +16,42 @@ class DataOutput(ABC):
         """Initialize the filename for CSV and JSON if provided, ignores for terminal."""
         self.filename = filename
 
+    def __init_subclass__(cls, **kwargs):
+        """Time every handler's output method as the "output.<class name>" stage."""
+        super().__init_subclass__(**kwargs)
+        if "output" in cls.__dict__: # Only wrap classes that define their own output
+            cls.output = _timed_output(cls.__dict__["output"])
+
     @abstractmethod
     def output(self, weather_data: dict):
-        """Abstract method to output weather data."""
+        """Abstract method to output weather data, given as a dict or WeatherRecord."""
+
+    def flush(self):
+        """Write out any buffered records, nothing to do for unbuffered handlers."""
+
+    def close(self):
+        """Release any open file, nothing to do for handlers that don't keep one open."""
+
+    def __enter__(self):
+        """Allow handlers to be used as context managers."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Flush and close when leaving the with block."""
+        self.close()
+
+
+def _timed_output(output):
+    """Wrap an output method so its duration is recorded per handler class when enabled."""
+
+    @functools.wraps(output)
+    def wrapper(self, weather_data):
+        """Call output, timing it if instrumentation is enabled."""
+        if not instrumentation.enabled:
+            return output(self, weather_data)
+        with instrumentation.timer(f"output.{type(self).__name__}"):
+            return output(self, weather_data)
+    return wrapper
 
 
 class TerminalOutput(DataOutput):
@@ -22,6 +60,7 @@ class TerminalOutput(DataOutput):
     def output(self, weather_data: dict) -> str:
         """Print the weather data to the terminal."""
 
+        weather_data = as_dict(weather_data) # Format local time now if given a WeatherRecord
         print(f"""
             Weather Data:
             Location: {weather_data["city"]}
@@ -41,6 +80,7 @@ class CSVOutput(DataOutput):
     def output(self, weather_data: dict) -> csv:
         """Creates and writes the CSV file with error checking."""
 
+        weather_data = as_dict(weather_data)
         try: # Try to open the file for writing
             with open(self.filename, "w", newline="", encoding="utf-8") as f:
                 # Create CSV writer with weather data keys as headers
@@ -54,16 +94,225 @@ class CSVOutput(DataOutput):
 class JSONOutput(DataOutput):
     """Outputs the weather data to a JSON file."""
 
-    def __init__(self, filename="weather_data.json"):
-        """Creates the filename for JSON output."""
+    def __init__(self, filename="weather_data.json", indent: int = 4):
+        """Creates the filename for JSON output, indent=None writes compact JSON."""
         super().__init__(filename)
+        self.indent = indent # Spaces per level, None or 2 can use the faster orjson encoder
 
-    def output(self, weather_data: dict) -> json:
+    def output(self, weather_data: dict):
         """Creates and writes the JSON file with error checking."""
 
+        weather_data = as_dict(weather_data)
         try: # Try to open the file for writing
             with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(weather_data, f, indent=4) # Write to JSON with indentation
+                f.write(fast_json.dumps(weather_data, self.indent)) # Write with the chosen indent
                 print(f"Weather data written to {self.filename}") # Print success message
         except IOError as e:  # Handle file writing errors such as permission or disk space issues
             print(f"Error writing to JSON file: {e}")
+
+
+class StreamOutput(DataOutput):
+    """Base class for handlers that keep one file open and append a record per output call."""
+
+    def __init__(self, filename, buffer_size: int = 64 * 1024):
+        """Store the filename and write buffer size, the file is opened on the first record."""
+        super().__init__(filename)
+        self.buffer_size = buffer_size # Bytes buffered before writing to disk
+        self.records = 0 # Records written since the file was opened
+        self._file = None
+
+    def _open(self):
+        """Open the file for appending, returning True if it was empty or new."""
+        self._file = open(self.filename, "a", newline="", encoding="utf-8",
+                          buffering=self.buffer_size)
+        return self._file.tell() == 0
+
+    def output(self, weather_data: dict):
+        """Append the record to the open file with error checking."""
+
+        weather_data = as_dict(weather_data)
+        try:
+            if self._file is None: # Open lazily so unused handlers don't create files
+                self._start(self._open(), weather_data)
+            self._write(weather_data)
+            self.records += 1
+        except IOError as e: # Handle file writing errors such as permission or disk space issues
+            print(f"Error writing to {self.filename}: {e}")
+
+    def flush(self):
+        """Write buffered records to disk."""
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        """Flush and close the file, printing how many records were written."""
+
+        if self._file:
+            try:
+                self._file.close()
+                print(f"Weather data written to {self.filename} ({self.records} records)")
+            except IOError as e:
+                print(f"Error writing to {self.filename}: {e}")
+            self._file = None
+
+    def _start(self, new_file: bool, weather_data: dict):
+        """Prepare a newly opened file, e.g. write a header, before the first record."""
+
+    @abstractmethod
+    def _write(self, weather_data: dict):
+        """Write one record to the open file."""
+
+
+class CSVStreamOutput(StreamOutput):
+    """Appends weather data to one CSV file, writing the header only once."""
+
+    def __init__(self, filename="weather_data.csv", buffer_size: int = 64 * 1024):
+        """Creates the filename for streaming CSV output."""
+        super().__init__(filename, buffer_size)
+        self._writer = None
+
+    def _start(self, new_file, weather_data):
+        """Create the CSV writer and write the header if the file is new."""
+        # Create CSV writer with weather data keys as headers
+        self._writer = csv.DictWriter(self._file, fieldnames=list(weather_data.keys()))
+        if new_file: # Appending to an existing file keeps its header
+            self._writer.writeheader()
+
+    def _write(self, weather_data):
+        """Write the weather data as a row in the CSV file."""
+        self._writer.writerow(weather_data)
+
+
+class JSONLinesOutput(StreamOutput):
+    """Appends weather data to a JSON Lines file, one JSON object per line."""
+
+    def __init__(self, filename="weather_data.jsonl", buffer_size: int = 64 * 1024):
+        """Creates the filename for JSON Lines output."""
+        super().__init__(filename, buffer_size)
+
+    def _write(self, weather_data):
+        """Write the weather data as a single line of JSON."""
+        self._file.write(fast_json.dumps(weather_data) + "\n")
+
+
+_STOP = object() # Queued by FanOutOutput.close to end the writer thread
+
+class FanOutOutput(DataOutput):
+    """Sends every record to several handlers from a background writer thread.
+
+    output only queues the record, so fetching carries on while the sinks write. The
+    queue holds at most queue_size records, output blocks when it's full so a slow
+    sink holds back the producer instead of using unbounded memory. The writer takes
+    up to batch_size queued records at a time and passes each to every sink in order.
+    """
+
+    def __init__(self, handlers: list, queue_size: int = 1024, batch_size: int = 64):
+        """Store the sinks, the writer thread is started by the first record."""
+        super().__init__()
+        self.handlers = list(handlers)
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock() # Guards starting the writer
+        self.error = None # First exception raised by a sink, re-raised by flush and close
+
+    def output(self, weather_data):
+        """Queue the record for every sink, waiting if the queue is full."""
+        self._start()
+        self._put(weather_data)
+
+    def flush(self):
+        """Wait until every queued record is written, then flush each sink."""
+
+        if self._thread is None: # Nothing was ever queued
+            for handler in self.handlers:
+                handler.flush()
+        else:
+            done = threading.Event()
+            self._put(done) # The writer flushes the sinks when it reaches this
+            while not done.wait(0.1): # Don't wait forever if the writer has died
+                self._check_writer()
+        self._raise_error()
+
+    def close(self):
+        """Write every queued record, stop the writer and close each sink."""
+
+        if self._thread is not None:
+            try:
+                self._put(_STOP) # Stops the writer after the records queued before it
+                self._thread.join()
+            except Exception as e: # Writer died, the sinks still need closing
+                self.error = self.error or e
+            self._thread = None
+        for handler in self.handlers:
+            handler.close()
+        self._raise_error()
+
+    def _start(self):
+        """Start the writer thread if it isn't running."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="output-writer",
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _put(self, item):
+        """Queue item for the writer, waiting while the queue is full and the writer is alive."""
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                self._check_writer()
+
+    def _check_writer(self):
+        """Raise the writer's error, or RuntimeError, if the writer thread has stopped."""
+        if not self._thread.is_alive():
+            self._raise_error()
+            raise RuntimeError("Output writer thread stopped")
+
+    def _run(self):
+        """Write queued records in batches until told to stop, keeping any error for flush."""
+        try:
+            self._write_batches()
+        except Exception as e: # Stops the writer, flush, close and output then raise it
+            self.error = self.error or e
+
+    def _write_batches(self):
+        """Take queued items in batches and pass them to the sinks until _STOP."""
+
+        while True:
+            batch = [self._queue.get()] # Wait for at least one item
+            while len(batch) < self.batch_size: # Then take whatever else is already queued
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is _STOP:
+                    return
+                if isinstance(item, threading.Event): # flush() is waiting for this
+                    self._write(lambda handler: handler.flush())
+                    item.set()
+                else:
+                    try:
+                        data = as_dict(item) # Format local time once, not once per sink
+                    except Exception as e: # A record that can't be formatted is skipped
+                        self.error = self.error or e
+                        continue
+                    self._write(lambda handler: handler.output(data))
+
+    def _write(self, action):
+        """Apply action to every sink, keeping the first error so the others still get data."""
+        for handler in self.handlers:
+            try:
+                action(handler)
+            except Exception as e: # Reported to the caller by flush or close
+                self.error = self.error or e
+
+    def _raise_error(self):
+        """Raise the first error a sink hit, once."""
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
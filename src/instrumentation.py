@@ -0,0 +1,140 @@
+""" Opt-in timing of each stage of a weather lookup, with pluggable callbacks and summaries. """
+
+import functools # Used to wrap timed functions
+import json # Used for the JSON summary
+import threading # Guards the counters when lookups run in threads
+import time # Used to time each stage
+
+class Instrumentation:
+    """Collects call counts and durations per stage while enabled, off by default.
+
+    Callbacks added with add_callback are called with (stage, seconds) for every
+    recorded duration, e.g. to forward timings to a metrics system.
+    """
+
+    def __init__(self):
+        """Start disabled with no recorded stages."""
+        self.enabled = False
+        self.callbacks = []
+        self._stages = {} # Stage name to [count, total, min, max]
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """Start recording."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording, keeping what was recorded so far."""
+        self.enabled = False
+
+    def reset(self):
+        """Forget all recorded durations."""
+        with self._lock:
+            self._stages.clear()
+
+    def add_callback(self, callback):
+        """Call callback(stage, seconds) for each duration recorded from now on."""
+        self.callbacks.append(callback)
+
+    def record(self, stage: str, seconds: float):
+        """Add one duration for the stage."""
+
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                self._stages[stage] = [1, seconds, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = min(stats[2], seconds)
+                stats[3] = max(stats[3], seconds)
+        for callback in self.callbacks:
+            callback(stage, seconds)
+
+    def timer(self, stage: str):
+        """Context manager that records how long its block took, if enabled."""
+        return _Timer(self, stage) if self.enabled else _NULL_TIMER
+
+    def timed(self, stage: str = None):
+        """Decorator recording each call's duration under stage (default: the function name)."""
+
+        def decorator(func):
+            """Wrap func, adding only a flag check when instrumentation is disabled."""
+            name = stage or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                """Call func, timing it if enabled."""
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def summary(self) -> dict:
+        """Return {stage: {count, total_ms, mean_ms, min_ms, max_ms}} sorted by total time."""
+
+        with self._lock:
+            stages = sorted(self._stages.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            stage: {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total * 1000 / count, 3),
+                "min_ms": round(low * 1000, 3),
+                "max_ms": round(high * 1000, 3)
+            }
+            for stage, (count, total, low, high) in stages
+        }
+
+    def summary_json(self) -> str:
+        """Return the summary as a JSON string."""
+        return json.dumps(self.summary(), indent=2)
+
+    def summary_text(self) -> str:
+        """Return the summary as an aligned text table."""
+
+        lines = [f"{'stage':<28}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage:<28}{stats['count']:>8}{stats['total_ms']:>12.1f}"
+                         f"{stats['mean_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+        return "\n".join(lines)
+
+
+class _Timer:
+    """Records the duration of a with block."""
+
+    def __init__(self, owner: Instrumentation, stage: str):
+        """Store where to record the duration."""
+        self.owner = owner
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        """Start timing."""
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Record the time since __enter__."""
+        self.owner.record(self.stage, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    """Does nothing, used when instrumentation is disabled."""
+
+    def __enter__(self):
+        """Do nothing."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Do nothing."""
+
+
+_NULL_TIMER = _NullTimer()
+
+instrumentation = Instrumentation() # Shared instance used by the service, conversion and handlers
@@ -1,8 +1,17 @@
 """ Takes input from the user, fetches weather data, and outputs it in the selected format. """
 
+import argparse # Parse command line flags for non-interactive use
 import os # Access environment variables and handle file paths
-from dotenv import load_dotenv # Load environment variables from a .env file
-from handlers import TerminalOutput, CSVOutput, JSONOutput # Import output handlers for different formats
+import sys # Read cities from stdin and set the exit code
+import threading # Run the optional warm-up in the background
+import dt_conversion # Timezone data is preloaded by the warm-up thread
+from instrumentation import instrumentation # Optional per-stage timing
+from city_index import CapitalIndex, CityIndex # Resolve city names locally before any request
+from rate_limit import RateLimiter # Keeps calls within the API key's quota
+from watcher import WeatherWatcher # Polls a city list for new observations in watch mode
+# Import output handlers for different formats
+from handlers import TerminalOutput, CSVOutput, JSONOutput, CSVStreamOutput, JSONLinesOutput, \
+    FanOutOutput
 from weather_service import WeatherService # Import WeatherService class to fetch weather data
 
 def extension_checker(filename: str, f_type: str) -> str:
@@ -17,13 +26,66 @@ def extension_checker(filename: str, f_type: str) -> str:
         filename += f_type # Add the correct file extension if missing
     return filename
 
+def build_output_handler(output_format: str, filename: str = None, stream: bool = False,
+                         indent: int = 4):
+    """Returns the handler for the output format, fixing or defaulting the filename.
+
+    With stream set, CSV appends every record to one file and JSON is written as JSON Lines.
+    indent is used for JSON files, None writes them without indentation.
+    """
+
+    if stream and output_format == "json": # One JSON document can't be appended to
+        output_format = "jsonl"
+    match output_format:
+        case "terminal":
+            return TerminalOutput()
+        case "csv":
+            # Use default filename if none given, then check and correct file extension
+            filename = extension_checker(filename or "weather_data.csv", ".csv")
+            return CSVStreamOutput(filename) if stream else CSVOutput(filename)
+        case "json":
+            return JSONOutput(extension_checker(filename or "weather_data.json", ".json"), indent)
+        case "jsonl":
+            return JSONLinesOutput(extension_checker(filename or "weather_data.jsonl", ".jsonl"))
+    raise ValueError(f"Unknown output format: {output_format}")
+
+def parse_sink(value: str) -> tuple:
+    """Splits a --tee value of FORMAT or FORMAT=FILE into (format, filename or None)."""
+
+    output_format, _, filename = value.partition("=")
+    if output_format not in ("terminal", "csv", "json", "jsonl"):
+        raise argparse.ArgumentTypeError(f"unknown output format {output_format!r}")
+    return output_format, filename or None
+
+def add_sinks(handler, sinks: list):
+    """Returns handler, or a fan-out to it and a streaming handler per extra sink."""
+
+    if not sinks:
+        return handler
+    # Extra sinks are appended to like batch output, so one file collects every record
+    return FanOutOutput([handler] + [build_output_handler(output_format, filename, stream=True)
+                                     for output_format, filename in sinks])
+
+def clean_city(city: str) -> str:
+    """Validates a city name and returns it in the format sent to the API."""
+
+    city = city.lower().strip()
+    if not city: # If the city name is empty, the user needs to enter a valid city name
+        raise ValueError("City name cannot be empty")
+    for char in city: # Check if the city name contains only alphabetic characters
+        if not char.isalpha() and char not in (" ", ","):
+            raise ValueError(
+                "City name must contain letters, spaces or commas only"
+                )
+    return city.replace(" ", ",")  # Swap spaces with commas for multi-word cities
+
 def get_output_handler():
     """Prompts user to select output format and returns the corresponding handler."""
 
     print(f"""  
     Welcome to the Weather Application!
     This app fetches current weather, date and time from any Capital City in the world!
-    You can choose to output to terminal, a CSV file, or a JSON file.
+    You can choose to output to terminal, a CSV file, or a JSON Lines file.
     The local time is from the last weather update, given every ~10 minutes.
     Multi-word city names can be separated by commas or spaces or use the first word only.
     If the city shares its name, add the ISO 3166 state and country code, (e.g. "melbourne nsw au"). 
@@ -34,43 +96,320 @@ def get_output_handler():
                 Choose output format:
                 1. Terminal
                 2. CSV File
-                3. JSON File
+                3. JSON Lines File
                 4. Exit
                 Enter choice (1-4): 
                 """).strip()
         match choice: # Matches user input to select output and returns error if invalid
             case "1":
-                return TerminalOutput()
+                return build_output_handler("terminal")
             case "2":
                 filename = input(
                     "Enter CSV filename (default: weather_data.csv): "
-                    ) or "weather_data.csv" # Takes user input for filename or uses default
-                filename = extension_checker(filename, ".csv") # Check and correct file extension
-                return CSVOutput(filename)
+                    ) # Takes user input for filename or uses default
+                # Streamed so every city entered is added to the same file
+                return build_output_handler("csv", filename, stream=True)
             case "3":
                 filename = input(
-                    "Enter JSON filename (default: weather_data.json): "
-                    ) or "weather_data.json" # Takes user input for filename or uses default
-                filename = extension_checker(filename, ".json") # Check and correct file extension
-                return JSONOutput(filename)
+                    "Enter JSON Lines filename (default: weather_data.jsonl): "
+                    ) # Takes user input for filename or uses default
+                return build_output_handler("jsonl", filename, stream=True)
             case "4":
                 print("Exiting the application. Goodbye!")
                 exit()  # Exit the application
             case _:
                 print("\nInvalid choice, please enter 1, 2, 3 or 4.")
 
-def main():
+def parse_time(value: str) -> int:
+    """Converts a YYYY-MM-DD date (UTC) or Unix timestamp flag to a Unix timestamp."""
+
+    from datetime import datetime, timezone # Only needed for replay filters
+    if value.isdigit():
+        return int(value)
+    try:
+        return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD or a Unix time, got {value!r}")
+
+def parse_args(argv: list) -> argparse.Namespace:
+    """Parses command line flags, with no flags the app runs interactively."""
+
+    parser = argparse.ArgumentParser(
+        description="Fetch current weather for capital cities.")
+    parser.add_argument("-f", "--format", choices=("terminal", "csv", "json", "jsonl"),
+                        help="output format, skips the output menu")
+    parser.add_argument("-o", "--output", help="output filename for csv or json")
+    parser.add_argument("--compact", action="store_true",
+                        help="write json output without indentation (faster with orjson)")
+    parser.add_argument("-c", "--cities",
+                        help="file with one city per line, or - for stdin (runs in batch mode)")
+    parser.add_argument("-w", "--workers", type=int, default=10,
+                        help="number of cities fetched in parallel in batch mode (default: 10)")
+    parser.add_argument("--no-warm-up", action="store_true",
+                        help="don't preload timezone data while the output menu is shown")
+    parser.add_argument("--stats", action="store_true",
+                        help="print time spent in each stage of the lookups at exit")
+    parser.add_argument("--stats-json", help="write the stage timings to this JSON file at exit")
+    parser.add_argument("--profile", nargs="?", const="-",
+                        help="run under cProfile, printing the top functions or saving to a file")
+    parser.add_argument("--city-index",
+                        help="city index file, fetches known cities 20 at a time in batch mode")
+    parser.add_argument("--tee", type=parse_sink, action="append", metavar="FORMAT[=FILE]",
+                        help="also write every record to this output, can be repeated")
+    parser.add_argument("--no-capitals", action="store_true",
+                        help="don't look cities up in the bundled capital city list")
+    parser.add_argument("--cache", nargs="?", const="", metavar="FILE",
+                        help="reuse responses for 10 minutes, in memory or in this SQLite file")
+    parser.add_argument("--rate-limit", type=int,
+                        help="maximum API calls per minute, extra calls wait instead of failing")
+    parser.add_argument("--daily-limit", type=int, help="maximum API calls per day")
+    parser.add_argument("--processes", type=int,
+                        help="convert and write batch output in this many processes (csv or json)")
+    parser.add_argument("--archive", metavar="DIR",
+                        help="keep every raw API response in a compressed archive in DIR")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="output archived responses from DIR instead of calling the API "
+                             "(--cities filters them)")
+    parser.add_argument("--since", type=parse_time,
+                        help="replay observations from this date (YYYY-MM-DD) or Unix time")
+    parser.add_argument("--until", type=parse_time,
+                        help="replay observations before this date (YYYY-MM-DD) or Unix time")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep polling the --cities list, only outputting new observations")
+    parser.add_argument("--poll-interval", type=float, default=600,
+                        help="seconds between observations published by the API in watch mode")
+    args = parser.parse_args(argv)
+    if args.watch and not args.cities:
+        parser.error("--watch needs a city list from --cities")
+    if args.processes and (not args.cities or args.format in (None, "terminal")):
+        parser.error("--processes needs --cities and --format csv, json or jsonl")
+    if args.processes and args.tee: # Records are written by the worker processes only
+        parser.error("--tee can't be used with --processes")
+    if args.processes and (args.watch or args.city_index): # The pipeline fetches by name once
+        parser.error("--processes can't be used with --watch or --city-index")
+    return args
+
+def read_cities(source: str) -> list:
+    """Reads one city per line from a file or stdin ("-"), skipping blank lines."""
+
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [line for line in lines if line.strip()]
+
+def validate_cities(cities: list) -> list:
+    """Returns the cleaned valid cities, reporting each invalid one."""
+
+    valid = []
+    for city in cities: # Apply the same validation as the interactive loop
+        try:
+            valid.append(clean_city(city))
+        except ValueError as e:
+            print(f"Value Error: {city.strip()}: {e}")
+    return valid
+
+def run_batch(service: WeatherService, handler, cities: list, workers: int,
+              index: CityIndex = None) -> int:
+    """Fetches and outputs all cities in parallel, returning the exit code.
+
+    With a city index, cities it knows are fetched in groups through the bulk endpoint.
+
+    Exit codes: 0 if every city succeeded, 1 if none did, 2 if only some did.
+    """
+
+    valid = validate_cities(cities)
+    failures = len(cities) - len(valid)
+    results = service.get_weather_bulk(valid, index, max_workers=workers) if index \
+        else service.get_weather_many(valid, max_workers=workers)
+    for result in results:
+        if result.data:
+            handler.output(result.data)
+        else: # Report each failed city separately
+            print(f"{result.city}: {result.error}")
+            failures += 1
+    if not failures:
+        return 0
+    return 1 if failures == len(cities) else 2
+
+def run_pipeline(service: WeatherService, cities: list, workers: int, output_format: str,
+                 filename: str = None, processes: int = None) -> int:
+    """Fetches raw responses in threads, then converts and writes them across processes.
+
+    Exit codes match run_batch.
+    """
+
+    from pipeline import process_payloads # Only needed for multi-process output
+    valid = validate_cities(cities)
+    failures = len(cities) - len(valid)
+    payloads = []
+    for result in service.get_weather_many(valid, max_workers=workers, raw=True):
+        if result.data:
+            payloads.append(result.data)
+        else:
+            print(f"{result.city}: {result.error}")
+            failures += 1
+    output_format = "csv" if output_format == "csv" else "jsonl" # Part files are appendable
+    filename = extension_checker(filename or f"weather_data.{output_format}", f".{output_format}")
+    written, errors = process_payloads(payloads, filename, output_format, processes)
+    print(f"Weather data written to {filename} ({written} records)")
+    failures += errors
+    if not failures:
+        return 0
+    return 1 if failures == len(cities) else 2
+
+def run_watch(service: WeatherService, handler, cities: list, workers: int,
+              update_interval: float = 600) -> int:
+    """Polls the cities until SIGTERM or Ctrl+C, outputting only new observations."""
+
+    import signal # Only needed in watch mode
+    watcher = WeatherWatcher(service, handler, validate_cities(cities),
+                             update_interval, max_workers=workers)
+    # Finish the current round and close the output cleanly when asked to stop
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    print(f"Watch stopped: {watcher.stats()}", file=sys.stderr)
+    return 0
+
+def start_warm_up(service: WeatherService) -> threading.Thread:
+    """Loads timezone data and the HTTP session in a background thread, returning the thread."""
+
+    def warm_up():
+        """Do the slow first-use work before the first city is entered."""
+        dt_conversion.warm_up() # Imports pytz and timezonefinder and loads the polygon data
+        service.session # Imports requests and builds the connection pool
+
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def main(argv: list = None):
     """ Main function to run the weather application. """
 
+    args = parse_args(argv or []) # No arguments runs the interactive menu
+    if args.stats or args.stats_json:
+        instrumentation.enable() # Record per-stage timings for the summary at exit
+    profiler = None
+    if args.profile:
+        import cProfile # Only needed when profiling
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return run(args)
+    finally: # Also runs when the interactive loop exits with exit()
+        if profiler:
+            profiler.disable()
+            report_profile(profiler, args.profile)
+        if args.stats:
+            print(instrumentation.summary_text(), file=sys.stderr)
+        if args.stats_json:
+            with open(args.stats_json, "w", encoding="utf-8") as f:
+                f.write(instrumentation.summary_json())
+
+def report_profile(profiler, destination: str):
+    """Print the top functions by cumulative time, or save the raw stats to a file."""
+
+    import pstats # Only needed when profiling
+    if destination == "-":
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+    else: # Open later with python -m pstats or snakeviz
+        profiler.dump_stats(destination)
+
+def run(args: argparse.Namespace):
+    """Runs the application in batch or interactive mode using parsed flags."""
+
+    cities = None
+    if args.cities: # Read up front so a bad path fails before any setup
+        try:
+            cities = read_cities(args.cities)
+        except OSError as e:
+            print(f"Error: Unable to read cities from {args.cities} ({e.strerror or e})")
+            return 1
+
+    if args.replay: # Archived responses only, no API key needed
+        return run_replay(args, cities)
+
+    from dotenv import load_dotenv # Load environment variables, imported here to start faster
     load_dotenv() # Load environment variables from .env file
     api_key = os.getenv("OWM_API_KEY") # Get the API key from environment variables
 
     if not api_key: # Exit if API key is not found
         print("Error: Missing API key in .env file")
-        exit()
+        exit(1)
+
+    limiter = None
+    if args.rate_limit or args.daily_limit: # One budget shared by every worker thread
+        limiter = RateLimiter(args.rate_limit or 60, args.daily_limit)
+
+    cache = None
+    if args.cache is not None: # Repeat cities are served locally instead of using the quota
+        from cache import MemoryCache, SQLiteCache # Imported here to start faster
+        cache = SQLiteCache(args.cache) if args.cache else MemoryCache()
+
+    # Bundled capital cities, looked up by coordinates and suggested when a city isn't found
+    capitals = None if args.no_capitals else CapitalIndex()
+    archive = None
+    if args.archive: # Keep raw responses so outputs can be rebuilt without the API
+        from archive import PayloadArchive # Imported here to start faster
+        archive = PayloadArchive(args.archive)
+
+    # Create an instance of WeatherService with the API key, closing its connection pool on exit
+    with WeatherService(api_key, pool_size=max(args.workers, 1), rate_limiter=limiter,
+                        cache=cache, archive=archive, capitals=capitals) as service:
+        try:
+            if args.processes: # Batch mode with output written by worker processes
+                return run_pipeline(service, cities, args.workers,
+                                    args.format, args.output, args.processes)
+            if args.cities: # Batch or watch mode, no prompts, every city goes into one output file
+                with add_sinks(build_output_handler(args.format or "terminal", args.output,
+                                                    stream=True), args.tee) as handler:
+                    if args.watch:
+                        return run_watch(service, handler, cities,
+                                         args.workers, args.poll_interval)
+                    index = CityIndex.load(args.city_index) if args.city_index else None
+                    return run_batch(service, handler, cities, args.workers, index)
+            if not args.no_warm_up: # Preload while the user reads the menu
+                start_warm_up(service)
+            # Use the output format from the flags if given, otherwise show the menu. CSV is
+            # streamed like the menu's, json stays one (indented) document of the latest city
+            handler = build_output_handler(args.format, args.output, stream=args.format != "json",
+                                           indent=None if args.compact else 4) if args.format \
+                else get_output_handler()
+            handler = add_sinks(handler, args.tee)
+            weather_loop(service, handler, args.tee)
+        finally:
+            if limiter and args.stats: # Queue depth and time spent waiting for the quota
+                print(f"Rate limiter: {limiter.stats()}", file=sys.stderr)
+            if cache and args.stats: # Hits are calls the quota didn't pay for
+                print(f"Cache: {cache.stats()}", file=sys.stderr)
+
+def run_replay(args: argparse.Namespace, cities: list = None) -> int:
+    """Outputs archived responses through the chosen handler, returning 0 if any matched."""
+
+    from archive import PayloadArchive # Only needed for replay
+    if not os.path.isdir(args.replay):
+        print(f"Error: No archive found at {args.replay}")
+        return 1
+    with PayloadArchive(args.replay) as archive, \
+            add_sinks(build_output_handler(args.format or "terminal", args.output, stream=True),
+                      args.tee) as handler:
+        count = archive.replay(handler, cities, args.since, args.until)
+    if not count:
+        print("No archived weather data matched")
+        return 1
+    return 0
+
+def weather_loop(service: WeatherService, handler, sinks: list = None):
+    """Prompts for cities and outputs their weather until the user exits.
 
-    service = WeatherService(api_key) # Create an instance of WeatherService with the API key
-    handler = get_output_handler() # Get the output handler based on user choice
+    sinks are the --tee outputs, kept when the user picks a new output with "return".
+    """
 
     while True: # Loop to continuously prompt for city input until correct input is provided
         city = input("""
@@ -80,26 +419,24 @@ def main():
         """).lower().strip()
         match city:
             case "exit": # Exit the application if user inputs "exit"
+                handler.close() # Close any file kept open by a streaming handler
                 exit()
             case "return": # Return to the output handler selection if user inputs "return"
-                handler = get_output_handler()
+                handler.close()
+                handler = add_sinks(get_output_handler(), sinks) # Reopens the --tee outputs too
             case "": # If the city name is empty, prompt the user to enter a valid city name
                 print("City name cannot be empty. Please try again.")
             case _:
                 try:
-                    for char in city: # Check if the city name contains only alphabetic characters
-                        if not char.isalpha() and char not in (" ", ","):
-                            raise ValueError(
-                                "City name must contain letters, spaces or commas only"
-                                )
-                    city = city.replace(" ", ",")  # Swap spaces with commas for multi-word cities
+                    city = clean_city(city) # Validate and format the city name for the API
                     weather_data = service.get_weather_data(city)
                     if weather_data: # Check if weather data is not empty
                         handler.output(weather_data)
+                        handler.flush() # Make sure the record is on disk before the next prompt
                     else: # If no data is returned, raise an error
                         raise ValueError("No data found for the specified city.")
                 except ValueError as e:
                     print(f"Value Error: {e}")
                     
 if __name__ == "__main__":
-    main() # Checks if the script is being run from main before calling
+    sys.exit(main(sys.argv[1:])) # Checks if the script is being run from main before calling
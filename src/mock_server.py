@@ -0,0 +1,166 @@
+""" Local stand-in for the OpenWeatherMap API, used by benchmarks and tests. """
+
+import json # Used to encode responses
+import random # Used for latency jitter and injected errors
+import threading # Runs the server in the background and guards the counters
+import time # Used to simulate network latency
+from collections import Counter # Counts requests per city
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # Serves the fake API
+from urllib.parse import parse_qs, urlparse # Reads the query string
+
+# A few real locations so responses exercise timezone conversion across several zones
+LOCATIONS = [
+    (51.5085, -0.1257), (48.8534, 2.3488), (35.6895, 139.6917), (-33.8679, 151.2073),
+    (40.7143, -74.006), (-34.6132, -58.3772), (55.7522, 37.6156), (28.6358, 77.2245)
+]
+
+class MockOWMServer:
+    """Serves OWM shaped JSON for /data/2.5/weather (q or lat/lon) and /data/2.5/group on localhost.
+
+    latency and jitter are seconds added to each response, error_rate is the fraction
+    of requests answered with 500 and rate_limit_rate the fraction answered with 429.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: int = 1, seed: int = None):
+        """Configure the simulated behaviour, the server starts with start() or a with block."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after # Seconds sent in the Retry-After header of a 429
+        self.requests = Counter() # Requests received per city query or id list
+        self.statuses = Counter() # Responses sent per status code
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server, e.g. http://127.0.0.1:54321."""
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def weather_url(self) -> str:
+        """URL to use as WeatherService.url."""
+        return f"{self.url}/data/2.5/weather"
+
+    @property
+    def group_url(self) -> str:
+        """URL to use as WeatherService.group_url."""
+        return f"{self.url}/data/2.5/group"
+
+    def total_requests(self) -> int:
+        """Return the number of requests received."""
+        with self._lock:
+            return sum(self.requests.values())
+
+    def start(self) -> "MockOWMServer":
+        """Start serving on a free port in a background thread."""
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True # Don't wait for keep-alive connections on shutdown
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,),
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server and close its socket."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        """Start the server when entering a with block."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the server when leaving the with block."""
+        self.stop()
+
+    def weather_json(self, name: str, city_id: int = None) -> dict:
+        """Return an OWM shaped weather object for the city."""
+
+        seed = sum(name.encode()) if city_id is None else city_id # Stable values per city
+        lat, lon = LOCATIONS[seed % len(LOCATIONS)]
+        return {
+            "coord": {"lon": lon, "lat": lat},
+            "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+            "base": "stations",
+            "main": {"temp": round(10 + seed % 20 + 0.5, 2), "feels_like": 12.1,
+                     "temp_min": 9.0, "temp_max": 14.0, "pressure": 1012,
+                     "humidity": 40 + seed % 50},
+            "visibility": 10000,
+            "wind": {"speed": 4.1, "deg": 80},
+            "clouds": {"all": 0},
+            "dt": 1609459200 + seed % 600,
+            "sys": {"type": 2, "id": 2075535, "country": "GB",
+                    "sunrise": 1609401600, "sunset": 1609430400},
+            "timezone": 0,
+            "id": city_id if city_id is not None else 1000000 + seed,
+            "name": name,
+            "cod": 200
+        }
+
+    def _make_handler(self):
+        """Build the request handler class bound to this server's settings."""
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answers each GET with weather JSON, an injected error, or a 404."""
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+            disable_nagle_algorithm = True # Don't let delayed ACKs add ~40ms per response
+            wbufsize = 64 * 1024 # Send headers and body together, flushed after each request
+
+            def do_GET(self): # Name required by BaseHTTPRequestHandler
+                """Serve the weather or group endpoint."""
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                key = query.get("q", query.get("id", [""]))[0]
+                if "lat" in query and "lon" in query: # Coordinate lookup
+                    key = f"{query['lat'][0]},{query['lon'][0]}"
+                with mock._lock:
+                    mock.requests[key] += 1
+                    roll = mock._random.random()
+                    delay = mock.latency + mock._random.uniform(0, mock.jitter)
+                time.sleep(delay)
+
+                if roll < mock.rate_limit_rate:
+                    self._send(429, {"cod": 429, "message": "rate limited"},
+                               {"Retry-After": str(mock.retry_after)})
+                elif roll < mock.rate_limit_rate + mock.error_rate:
+                    self._send(500, {"cod": 500, "message": "internal error"})
+                elif url.path.endswith("/weather") and "q" in query:
+                    self._send(200, mock.weather_json(key.replace(",", " ").title()))
+                elif url.path.endswith("/weather") and "lat" in query:
+                    self._send(200, mock.weather_json(f"Near {key}"))
+                elif url.path.endswith("/group") and "id" in query:
+                    ids = [int(i) for i in key.split(",") if i]
+                    items = [mock.weather_json(f"City {i}", i) for i in ids]
+                    self._send(200, {"cnt": len(items), "list": items})
+                else:
+                    self._send(404, {"cod": "404", "message": "city not found"})
+
+            def _send(self, status: int, body: dict, headers: dict = None):
+                """Write a JSON response."""
+
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with mock._lock:
+                    mock.statuses[status] += 1
+
+            def log_message(self, *args):
+                """Silence per-request logging."""
+
+        return Handler
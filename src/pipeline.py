@@ -0,0 +1,97 @@
+""" Converts and writes large batches of raw OWM payloads in parallel processes, one part file per shard. """
+
+import argparse # Parse options when processing a payload file from the command line
+import csv # Writes CSV part files
+import os # Builds and removes part file paths
+import shutil # Copies part files into the final output
+import tempfile # Holds the part files until they're merged
+from concurrent.futures import ProcessPoolExecutor # Uses every core, unlike threads
+import dt_conversion # Each worker loads the timezone data once
+import fast_json # Writes JSON Lines parts and reads payload files
+from records import WeatherRecord # Parses each payload
+
+SHARD_SIZE = 5000 # Payloads per task, large enough that process overhead is small
+FIELDS = ["city", "temperature", "humidity", "condition", "local_time"] # Output columns
+
+def _init_worker(grid_path: str = None):
+    """Load the timezone finder (and grid) once per worker process, not once per shard."""
+    dt_conversion.reset_finder() # Forked workers mustn't share the parent's file handles
+    if grid_path:
+        dt_conversion.use_timezone_grid(grid_path)
+    dt_conversion.warm_up()
+
+def _process_shard(task: tuple) -> tuple:
+    """Convert one shard of payloads and write it to its part file, returning (written, errors)."""
+
+    part_path, output_format, payloads = task
+    records, errors = [], 0
+    for payload in payloads:
+        try:
+            records.append(WeatherRecord.from_owm(payload))
+        except (KeyError, IndexError, TypeError): # Incomplete payloads are counted, not fatal
+            errors += 1
+    # One vectorized conversion per timezone instead of strftime per record
+    local_times = dt_conversion.convert_times_batch(
+        [r.dt for r in records], [(r.lat, r.lon) for r in records])
+    rows = [r.to_dict(local_time) for r, local_time in zip(records, local_times)]
+    with open(part_path, "w", newline="", encoding="utf-8") as f:
+        if output_format == "csv":
+            csv.DictWriter(f, fieldnames=FIELDS).writerows(rows) # Header is added when merging
+        else:
+            f.writelines(fast_json.dumps(row) + "\n" for row in rows)
+    return len(rows), errors
+
+def process_payloads(payloads, filename: str, output_format: str = "csv", workers: int = None,
+                     shard_size: int = SHARD_SIZE, grid_path: str = None) -> tuple:
+    """Convert and write payloads to filename across worker processes, returning (written, errors).
+
+    output_format is "csv" or "jsonl". Records keep the order of payloads, and the
+    file is replaced rather than appended to.
+    """
+
+    if output_format not in ("csv", "jsonl"):
+        raise ValueError(f"Unsupported pipeline format: {output_format}")
+    payloads = list(payloads)
+    shards = [payloads[i:i + shard_size] for i in range(0, len(payloads), shard_size)]
+    # Parts go next to the output so merging doesn't cross filesystems
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(filename))) as parts_dir:
+        tasks = [(os.path.join(parts_dir, f"part-{i:05d}"), output_format, shard)
+                 for i, shard in enumerate(shards)]
+        written = errors = 0
+        if tasks:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks)),
+                                     initializer=_init_worker, initargs=(grid_path,)) as pool:
+                for shard_written, shard_errors in pool.map(_process_shard, tasks):
+                    written += shard_written
+                    errors += shard_errors
+        merge_parts([task[0] for task in tasks], filename,
+                    ",".join(FIELDS) + "\r\n" if output_format == "csv" else "")
+    return written, errors
+
+def merge_parts(part_paths: list, filename: str, header: str = ""):
+    """Write header then each part file, in order, to filename."""
+
+    with open(filename, "w", newline="", encoding="utf-8") as out:
+        out.write(header)
+        for part_path in part_paths:
+            with open(part_path, newline="", encoding="utf-8") as part:
+                shutil.copyfileobj(part, out, 1024 * 1024)
+
+def read_payloads(path: str) -> list:
+    """Read raw OWM payloads from a JSON Lines file, one weather object per line."""
+    with open(path, "rb") as f:
+        return [fast_json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    # Backfill from saved payloads: python src/pipeline.py payloads.jsonl weather.csv --processes 8
+    parser = argparse.ArgumentParser(description="Convert raw OWM payloads to CSV or JSON Lines.")
+    parser.add_argument("payloads", help="JSON Lines file of raw OWM weather objects")
+    parser.add_argument("output", help="output file, .csv or .jsonl")
+    parser.add_argument("--processes", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--tz-grid", help="timezone grid file built by tz_grid.py")
+    args = parser.parse_args()
+    fmt = "jsonl" if args.output.endswith(".jsonl") else "csv"
+    count, failed = process_payloads(read_payloads(args.payloads), args.output, fmt,
+                                     args.processes, args.shard_size, args.tz_grid)
+    print(f"Wrote {count} records to {args.output} ({failed} payloads skipped)")
@@ -0,0 +1,121 @@
+""" Token bucket rate limiter that queues API calls to stay within OpenWeatherMap quotas. """
+
+import threading # Shares one budget between worker threads
+import time # Used to refill buckets and wait for tokens
+
+class TokenBucket:
+    """Holds up to capacity tokens, refilled continuously at rate tokens per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        """Start full so the first capacity calls don't wait."""
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        """Add the tokens earned since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a whole token is available, 0 if one is available now."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate else float("inf")
+
+
+class RateLimiter:
+    """Blocks callers until a call fits within the per-minute and optional per-day budgets.
+
+    Each budget is a token bucket holding a small burst, refilled so that no sliding
+    window (minute or day) ever allows more calls than the quota. One limiter can be
+    shared by every thread using the same API key.
+    """
+
+    def __init__(self, per_minute: int = 60, per_day: int = None, burst: int = None):
+        """Create the buckets, burst defaults to a tenth of the per-minute quota."""
+
+        burst = burst or max(1, per_minute // 10)
+        # Refill the rest of the quota across the minute, so burst + refills never exceed it
+        self._buckets = [TokenBucket(burst, max(per_minute - burst, 1) / 60)]
+        if per_day:
+            day_burst = max(1, min(burst, per_day // 24))
+            self._buckets.append(TokenBucket(day_burst, max(per_day - day_burst, 1) / 86400))
+        self._lock = threading.Lock()
+        self._paused_until = 0.0 # Monotonic time before which no calls are allowed
+        self.acquired = 0 # Calls let through
+        self.waiting = 0 # Callers currently queued
+        self.max_waiting = 0 # Largest queue seen
+        self.total_wait = 0.0 # Seconds spent queued by all callers
+        self.max_wait = 0.0 # Longest single wait
+        self.pauses = 0 # Retry-After pauses applied
+
+    def _try_acquire(self, now: float) -> float:
+        """Take a token from every bucket and return 0, or return how long to wait."""
+
+        wait = self._paused_until - now
+        for bucket in self._buckets:
+            bucket.refill(now)
+            wait = max(wait, bucket.wait_time())
+        if wait > 0:
+            return wait
+        for bucket in self._buckets:
+            bucket.tokens -= 1
+        return 0.0
+
+    def acquire(self):
+        """Block until the call is allowed, queuing behind the budget instead of failing."""
+
+        start = time.monotonic()
+        wait = float("inf") # Not acquired yet
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(time.monotonic())
+                if not wait:
+                    break
+                time.sleep(min(wait, 1.0)) # Re-check at least every second in case of a pause
+        finally:
+            waited = time.monotonic() - start
+            with self._lock:
+                self.waiting -= 1
+                if not wait:
+                    self.acquired += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for seconds, e.g. after a 429 with a Retry-After header."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.pauses += 1
+
+    def stats(self) -> dict:
+        """Return calls let through, current and peak queue depth, and wait times."""
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "total_wait_s": round(self.total_wait, 3),
+                "max_wait_s": round(self.max_wait, 3),
+                "pauses": self.pauses
+            }
+
+def parse_retry_after(value: str, default: float = 1.0) -> float:
+    """Return the seconds to wait from a Retry-After header (seconds or an HTTP date)."""
+
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        from email.utils import parsedate_to_datetime # Only needed for the date form
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
@@ -0,0 +1,55 @@
+""" Defines a compact record type for one weather observation. """
+
+import sys # Used to intern repeated condition strings
+from dataclasses import dataclass # Generates the slotted record class
+from dt_conversion import convert_time # Formats local time when the record is output
+
+@dataclass(frozen=True, slots=True)
+class WeatherRecord:
+    """One weather observation holding raw values, local time is only formatted when needed."""
+
+    city: str # City name as returned by the API
+    temperature: float # Temperature in Celsius
+    humidity: int # Humidity percentage
+    condition: str # Weather description, interned as there are only a few dozen
+    condition_code: int # OWM weather condition code
+    dt: int # Unix timestamp of the last weather update
+    lat: float # Latitude of the city
+    lon: float # Longitude of the city
+
+    @classmethod
+    def from_owm(cls, data: dict) -> "WeatherRecord":
+        """Build a record from one OWM weather object, raising KeyError or IndexError if incomplete."""
+        weather = data["weather"][0]
+        return cls(
+            city=data["name"],
+            temperature=data["main"]["temp"],
+            humidity=data["main"]["humidity"],
+            condition=sys.intern(weather["description"]),
+            condition_code=weather.get("id", 0),
+            dt=data["dt"],
+            lat=data["coord"]["lat"],
+            lon=data["coord"]["lon"]
+        )
+
+    @property
+    def local_time(self) -> str:
+        """Local time of the last weather update, formatted on each access."""
+        return convert_time(self.dt, {"lat": self.lat, "lon": self.lon})
+
+    def to_dict(self, local_time: str = None) -> dict:
+        """Return the dictionary shape used by the output handlers and get_weather_data.
+
+        Pass local_time if it was already formatted, e.g. by convert_times_batch.
+        """
+        return {
+            "city": self.city,
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "condition": self.condition,
+            "local_time": self.local_time if local_time is None else local_time
+        }
+
+def as_dict(weather_data) -> dict:
+    """Return weather data as a dictionary, whether given a dict or a WeatherRecord."""
+    return weather_data.to_dict() if isinstance(weather_data, WeatherRecord) else weather_data
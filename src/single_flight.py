@@ -0,0 +1,78 @@
+""" Coalesces concurrent duplicate calls so only one runs and every caller shares its outcome. """
+
+import threading # Lets callers in other threads wait for the call in flight
+
+class _Call:
+    """One call in flight, holding its result or error once it finishes."""
+
+    def __init__(self):
+        """Create the call with nothing finished yet."""
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs at most one call per key at a time, for threads.
+
+    Callers arriving while a call for the same key is in flight wait for it and get
+    its result, or have its exception raised, instead of making their own call.
+    """
+
+    def __init__(self):
+        """Start with no calls in flight."""
+        self._calls = {} # Key to the _Call in flight
+        self._lock = threading.Lock()
+        self.calls = 0 # Calls actually made
+        self.shared = 0 # Callers served by another caller's call
+
+    def do(self, key, func, *args):
+        """Return func(*args), or the outcome of the call already running for key."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None: # First caller runs the call
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = func(*args)
+            except Exception as e: # Shared with every waiting caller
+                call.error = e
+            finally:
+                with self._lock: # Callers from now on start a new call
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+class AsyncSingleFlight:
+    """Runs at most one coroutine per key at a time, for asyncio tasks on one event loop."""
+
+    def __init__(self):
+        """Start with no calls in flight."""
+        self._calls = {} # Key to the asyncio future of the call in flight
+        self.calls = 0 # Calls actually made
+        self.shared = 0 # Callers served by another caller's call
+
+    async def do(self, key, func, *args):
+        """Return await func(*args), or the outcome of the call already running for key."""
+        import asyncio # Only needed by the async variant
+
+        future = self._calls.get(key)
+        if future is not None: # No await since the check, so no lock is needed
+            self.shared += 1
+            # shield so a cancelled waiter doesn't cancel the call for everyone else
+            return await asyncio.shield(future)
+        future = self._calls[key] = asyncio.ensure_future(func(*args))
+        self.calls += 1
+        # Forget the call once it finishes, even if this caller is cancelled before then
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield so cancelling this caller doesn't cancel the call for the waiters
+        return await asyncio.shield(future)
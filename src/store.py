@@ -0,0 +1,132 @@
+""" Columnar in-memory store of repeated weather observations, backed by NumPy arrays. """
+
+import json # Used to save the city names alongside the observations
+import os # Used to build file paths for saving and loading
+import numpy as np # Used for the column arrays and vectorized queries
+from records import WeatherRecord # Observations are appended as WeatherRecords
+
+# One row per observation, packed to 19 bytes
+OBSERVATION_DTYPE = np.dtype([
+    ("city_id", np.uint32), # Index into WeatherStore.cities
+    ("dt", np.int64), # Unix timestamp of the weather update
+    ("temperature", np.float32), # Temperature in Celsius
+    ("humidity", np.uint8), # Humidity percentage
+    ("condition_code", np.uint16) # OWM weather condition code
+])
+
+class WeatherStore:
+    """Appends observations into a growable structured array and answers vectorized queries."""
+
+    def __init__(self, capacity: int = 1024):
+        """Create an empty store with room for capacity observations before growing."""
+        self._data = np.empty(capacity, dtype=OBSERVATION_DTYPE)
+        self._size = 0 # Number of rows in use
+        self.cities = [] # City names, position is the city id
+        self._city_ids = {} # City name to city id
+
+    def __len__(self):
+        """Return the number of observations stored."""
+        return self._size
+
+    @property
+    def data(self) -> np.ndarray:
+        """Structured array view of the stored observations."""
+        return self._data[:self._size]
+
+    def city_id(self, city: str) -> int:
+        """Return the id for a city name, assigning a new one the first time it's seen."""
+
+        if city not in self._city_ids:
+            self._city_ids[city] = len(self.cities)
+            self.cities.append(city)
+        return self._city_ids[city]
+
+    def append(self, record: WeatherRecord):
+        """Add one observation."""
+        self.extend([record])
+
+    def extend(self, records: list):
+        """Add many observations, growing the arrays at most once."""
+
+        records = list(records)
+        self._reserve(self._size + len(records))
+        rows = self._data[self._size:self._size + len(records)]
+        rows["city_id"] = [self.city_id(r.city) for r in records]
+        rows["dt"] = [r.dt for r in records]
+        rows["temperature"] = [r.temperature for r in records]
+        rows["humidity"] = [r.humidity for r in records]
+        rows["condition_code"] = [r.condition_code for r in records]
+        self._size += len(records)
+
+    def _reserve(self, needed: int):
+        """Make sure there is room for needed rows, doubling capacity so appends stay amortised O(1)."""
+
+        if needed <= len(self._data) and self._data.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self._data), 1024)
+        grown = np.empty(capacity, dtype=OBSERVATION_DTYPE)
+        grown[:self._size] = self._data[:self._size] # Also copies out of a read-only memory map
+        self._data = grown
+
+    def summary(self, start: int = None, end: int = None, field: str = "temperature") -> dict:
+        """Return {city: (min, max, mean, count)} of a field for observations with start <= dt < end."""
+
+        rows = self.data
+        mask = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            mask &= rows["dt"] >= start
+        if end is not None:
+            mask &= rows["dt"] < end
+        rows = rows[mask]
+        if not len(rows):
+            return {}
+
+        # Sort by city so each city's rows are contiguous, then reduce each run in one call
+        order = np.argsort(rows["city_id"], kind="stable")
+        city_ids = rows["city_id"][order]
+        values = rows[field][order].astype(np.float64)
+        starts = np.flatnonzero(np.r_[True, city_ids[1:] != city_ids[:-1]])
+        counts = np.diff(np.r_[starts, len(values)])
+        mins = np.minimum.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        means = np.add.reduceat(values, starts) / counts
+        return {
+            self.cities[city_ids[i]]: (float(lo), float(hi), float(mean), int(count))
+            for i, lo, hi, mean, count in zip(starts, mins, maxs, means, counts)
+        }
+
+    def latest(self) -> dict:
+        """Return {city: row} holding the most recent observation for each city."""
+
+        rows = self.data
+        if not len(rows):
+            return {}
+        # Sort by city then time, the last row of each city run is its latest observation
+        order = np.lexsort((rows["dt"], rows["city_id"]))
+        sorted_rows = rows[order]
+        ends = np.flatnonzero(np.r_[sorted_rows["city_id"][1:] != sorted_rows["city_id"][:-1], True])
+        return {self.cities[row["city_id"]]: row for row in sorted_rows[ends]}
+
+    def save(self, directory):
+        """Write the observations as observations.npy and city names as cities.json."""
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "observations.npy"), self.data)
+        with open(os.path.join(directory, "cities.json"), "w", encoding="utf-8") as f:
+            json.dump(self.cities, f)
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True) -> "WeatherStore":
+        """Open a saved store, memory mapping the observations read-only unless mmap is False.
+
+        A memory mapped store is copied into memory the first time something is appended.
+        """
+
+        store = cls(capacity=0)
+        store._data = np.load(os.path.join(directory, "observations.npy"),
+                              mmap_mode="r" if mmap else None)
+        store._size = len(store._data)
+        with open(os.path.join(directory, "cities.json"), encoding="utf-8") as f:
+            for city in json.load(f):
+                store.city_id(city)
+        return store
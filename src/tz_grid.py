@@ -0,0 +1,114 @@
+""" Precomputed H3 cell to timezone table for constant time timezone lookups. """
+
+import argparse # Parse options when building a grid from the command line
+import os # Builds the paths of the saved arrays
+import fast_json # Reads and writes the timezone names
+import h3.api.basic_int as h3 # H3 cells as integers, already required by timezonefinder
+import numpy as np # Stores the table as arrays that can be memory mapped
+
+DEFAULT_RESOLUTION = 5 # ~250 km² cells, small enough that few straddle a timezone border
+
+class TimezoneGrid:
+    """Maps H3 cells that lie entirely inside one timezone to that timezone's name.
+
+    Cells are held as a sorted uint64 array with a parallel uint16 array of indexes into
+    names, so a saved grid is memory mapped instead of read and lookups binary search it.
+    Cells crossing a border are left out, so lookups in them return None and the
+    caller falls back to TimezoneFinder.
+    """
+
+    def __init__(self, cells: np.ndarray, zones: np.ndarray, names: list,
+                 resolution: int = DEFAULT_RESOLUTION):
+        """Create the grid from sorted cells, their zones as indexes into names, and the names."""
+        self.cells = cells
+        self.zones = zones
+        self.names = names
+        self.resolution = resolution
+
+    @classmethod
+    def from_dict(cls, table: dict, resolution: int = DEFAULT_RESOLUTION) -> "TimezoneGrid":
+        """Create the grid from a {cell: timezone name} dictionary."""
+
+        names = sorted(set(table.values()))
+        name_index = {name: i for i, name in enumerate(names)}
+        cells = np.array(sorted(table), dtype=np.uint64)
+        zones = np.array([name_index[table[int(c)]] for c in cells], dtype=np.uint16)
+        return cls(cells, zones, names, resolution)
+
+    def to_dict(self) -> dict:
+        """Return the grid as a {cell: timezone name} dictionary."""
+        return dict(zip(self.cells.tolist(), (self.names[i] for i in self.zones.tolist())))
+
+    def __len__(self):
+        """Return the number of cells with a known timezone."""
+        return len(self.cells)
+
+    def lookup(self, lat: float, lon: float):
+        """Return the timezone name for the coordinates, or None if the cell isn't in the grid."""
+
+        cell = np.uint64(h3.latlng_to_cell(lat, lon, self.resolution))
+        i = int(np.searchsorted(self.cells, cell)) # Binary search, only touches a few pages
+        if i < len(self.cells) and self.cells[i] == cell:
+            return self.names[self.zones[i]]
+        return None
+
+    @classmethod
+    def build(cls, points, finder, resolution: int = DEFAULT_RESOLUTION, ring: int = 1):
+        """Build a grid covering each (lat, lon) point and the cells within ring steps of it.
+
+        A cell is kept if finder gives the same timezone at its centre, corners and edge
+        midpoints, which is a close approximation of the cell lying in a single timezone.
+        """
+
+        cells = set()
+        for lat, lon in points: # Cover the area around every populated point
+            cells.update(h3.grid_disk(h3.latlng_to_cell(lat, lon, resolution), ring))
+
+        table = {}
+        for cell in cells:
+            corners = h3.cell_to_boundary(cell)
+            midpoints = [((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+                         for a, b in zip(corners, corners[1:] + corners[:1])]
+            samples = [h3.cell_to_latlng(cell), *corners, *midpoints]
+            zones = {finder.timezone_at(lat=lat, lng=lon) for lat, lon in samples}
+            if len(zones) == 1 and None not in zones: # Entirely inside one timezone
+                table[cell] = zones.pop()
+        return cls.from_dict(table, resolution)
+
+    def save(self, path):
+        """Write the grid to the directory path as uncompressed .npy arrays and a names file."""
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "cells.npy"), self.cells) # Already sorted for searchsorted
+        np.save(os.path.join(path, "zones.npy"), self.zones)
+        with open(os.path.join(path, "names.json"), "w", encoding="utf-8") as f:
+            f.write(fast_json.dumps({"resolution": self.resolution, "names": self.names}))
+
+    @classmethod
+    def load(cls, path) -> "TimezoneGrid":
+        """Open a grid written by save, memory mapping the arrays rather than reading them."""
+
+        with open(os.path.join(path, "names.json"), "rb") as f:
+            meta = fast_json.loads(f.read())
+        # Pages are read on demand by lookups, so load time doesn't grow with the grid
+        cells = np.load(os.path.join(path, "cells.npy"), mmap_mode="r")
+        zones = np.load(os.path.join(path, "zones.npy"), mmap_mode="r")
+        return cls(cells, zones, meta["names"], meta["resolution"])
+
+def read_points(path) -> list:
+    """Read "lat,lon" lines from a file, skipping blank lines."""
+    with open(path, encoding="utf-8") as f:
+        return [tuple(float(v) for v in line.split(",")[:2]) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    # Build a grid once: python src/tz_grid.py points.csv tz_grid --resolution 5
+    from timezonefinder import TimezoneFinder # Only needed when building
+    parser = argparse.ArgumentParser(description="Precompute an H3 cell to timezone table.")
+    parser.add_argument("points", help='file of "lat,lon" lines for populated places')
+    parser.add_argument("output", help="directory to write the grid to")
+    parser.add_argument("--resolution", type=int, default=DEFAULT_RESOLUTION)
+    parser.add_argument("--ring", type=int, default=1, help="cells around each point to cover")
+    args = parser.parse_args()
+    grid = TimezoneGrid.build(read_points(args.points), TimezoneFinder(), args.resolution, args.ring)
+    grid.save(args.output)
+    print(f"Saved {len(grid)} cells to {args.output}")
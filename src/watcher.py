@@ -0,0 +1,106 @@
+""" Long-running watch mode that polls a fixed city list and only outputs new observations. """
+
+import heapq # Orders cities by when they're next due
+import threading # Lets a signal handler stop the loop while it sleeps
+import time # Used to schedule polls
+from concurrent.futures import ThreadPoolExecutor # Polls due cities concurrently
+from weather_service import WeatherServiceError # Failed polls are reported and retried
+
+UPDATE_INTERVAL = 600 # OpenWeatherMap publishes new observations roughly every 10 minutes
+UPDATE_LAG = 30 # Seconds after the expected update before polling, so it's likely published
+RETRY_INTERVAL = 60 # Seconds before polling again when nothing new was published or a poll failed
+
+class WeatherWatcher:
+    """Polls each city on a schedule aligned to its last observation time (dt).
+
+    A city is polled again update_interval + update_lag seconds after its last dt,
+    or retry_interval seconds from now if that time has already passed. Polls whose
+    dt hasn't advanced, or whose weather is the same as last output, aren't output.
+    """
+
+    def __init__(self, service: "WeatherService", handler: "DataOutput", cities: list,
+                 update_interval: float = UPDATE_INTERVAL, update_lag: float = UPDATE_LAG,
+                 retry_interval: float = RETRY_INTERVAL, max_workers: int = 10):
+        """Set up the schedule with every city due immediately."""
+        self.service = service
+        self.handler = handler
+        self.update_interval = update_interval
+        self.update_lag = update_lag
+        self.retry_interval = retry_interval
+        self.max_workers = max_workers
+        self._schedule = [(0.0, city) for city in dict.fromkeys(cities)] # (due time, city)
+        heapq.heapify(self._schedule)
+        self._last = {} # City to (dt, output data) of its last output record
+        self._stop = threading.Event()
+        self.polls = 0 # API calls made
+        self.emitted = 0 # Records output
+        self.stale = 0 # Polls where dt hadn't advanced
+        self.unchanged = 0 # Polls with a new dt but the same weather
+        self.errors = 0 # Failed polls
+
+    def stop(self):
+        """Ask the loop to finish, safe to call from a signal handler or another thread."""
+        self._stop.set()
+
+    def next_poll(self, dt: int, now: float) -> float:
+        """Return when to poll a city whose latest observation is at dt."""
+        expected = dt + self.update_interval + self.update_lag # When the next one should be out
+        return expected if expected > now else now + self.retry_interval
+
+    def run(self, max_cycles: int = None):
+        """Poll due cities until stopped, or for max_cycles rounds, flushing output after each."""
+
+        cycles = 0
+        if not self._schedule: # No cities to watch
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while not self._stop.is_set() and (max_cycles is None or cycles < max_cycles):
+                # Sleep until the next city is due, waking immediately if stopped
+                if self._stop.wait(max(0.0, self._schedule[0][0] - time.time())):
+                    break
+                now = time.time()
+                due = []
+                while self._schedule and self._schedule[0][0] <= now:
+                    due.append(heapq.heappop(self._schedule)[1])
+                # Fetch in parallel, then compare and output here so handlers stay single threaded
+                for city, result in zip(due, pool.map(self._fetch, due)):
+                    heapq.heappush(self._schedule, (self.process(city, result), city))
+                self.handler.flush() # New records are on disk before sleeping again
+                cycles += 1
+
+    def _fetch(self, city: str):
+        """Return the city's WeatherRecord, or the WeatherServiceError if the poll failed."""
+        try:
+            return self.service.fetch_record(city)
+        except WeatherServiceError as e:
+            return e
+
+    def process(self, city: str, result) -> float:
+        """Output the polled record if it changed and return when the city is next due."""
+
+        self.polls += 1
+        now = time.time()
+        if isinstance(result, WeatherServiceError):
+            print(f"{city}: {result}")
+            self.errors += 1
+            return now + self.retry_interval
+        last_dt, last_data = self._last.get(city, (None, None))
+        if last_dt is not None and result.dt <= last_dt: # Nothing new published yet
+            self.stale += 1
+            return self.next_poll(last_dt, now)
+        data = result.to_dict()
+        # local_time always changes with dt, so compare the weather itself
+        if last_data is not None and \
+                {**data, "local_time": None} == {**last_data, "local_time": None}:
+            self.unchanged += 1
+        else:
+            self.handler.output(data)
+            self.emitted += 1
+            last_data = data
+        self._last[city] = (result.dt, last_data)
+        return self.next_poll(result.dt, now)
+
+    def stats(self) -> dict:
+        """Return the number of polls, records output, and polls skipped or failed."""
+        return {"polls": self.polls, "emitted": self.emitted, "stale": self.stale,
+                "unchanged": self.unchanged, "errors": self.errors}
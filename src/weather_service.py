@@ -1,56 +1,458 @@
 """Define a class to pull weather data from API, convert to dictionary, and handle errors."""
 
-import requests # Used to make HTTP requests
-from dt_conversion import convert_time  # Import convert_time function from dt_conversion module
+import dataclasses # Stores WeatherRecords in the response cache as plain dictionaries
+import threading # Used to guard creation of the shared session
+import time # Backs off between retries made under a rate limiter
+from concurrent.futures import ThreadPoolExecutor # Used to fetch many cities concurrently
+from typing import NamedTuple # Used to define the per-city result type
+from cache import normalize_query # Equivalent city queries share one in-flight request
+import fast_json # Decodes responses with orjson when installed
+from instrumentation import instrumentation # Optional per-stage timing
+from rate_limit import parse_retry_after # Reads how long to back off after a 429
+from records import WeatherRecord # Compact record built from each API response
+from single_flight import AsyncSingleFlight, SingleFlight # Coalesces duplicate lookups
+
+# requests and asyncio are imported where they're first needed so the CLI starts quickly
+
+RETRY_STATUSES = (429, 500, 502, 503, 504) # Rate limited or server side errors worth retrying
+GROUP_SIZE = 20 # Maximum city IDs the group endpoint accepts per request
+
+class WeatherServiceError(Exception):
+    """Raised when weather data can't be fetched, message is ready to show the user."""
+
+class CityResult(NamedTuple):
+    """Outcome of one lookup in a multi-city fetch, error is None on success."""
+    city: str # City query as passed in
+    data: "WeatherRecord | dict | None" # WeatherRecord, raw OWM JSON if raw, None if it failed
+    error: str | None # Error message if the lookup failed
 
 class WeatherService:
     """Class to pull weather data from a weather API."""
 
-    def __init__(self, api_key: str):
-        """Create instance with API key and OpenWeatherMap URL."""
+    def __init__(self, api_key: str, pool_size: int = 10, retries: int = 3,
+                 backoff_factor: float = 0.5, timeout: float = 10, cache: "ResponseCache" = None,
+                 rate_limiter: "RateLimiter" = None, rate_limit_retries: int = 5,
+                 archive: "PayloadArchive" = None, capitals: "CapitalIndex" = None):
+        """Create instance with API key, OpenWeatherMap URL and a pooled HTTP session.
+
+        Pass a MemoryCache or SQLiteCache as cache to reuse responses until they expire.
+        Pass a RateLimiter (shared by every service using the same key) to queue calls
+        within the quota; a 429 then pauses all callers for its Retry-After and is
+        retried up to rate_limit_retries times instead of failing. Other retries are
+        then also made here rather than by urllib3, so each one takes from the budget.
+
+        Concurrent lookups of the same city share one request and its result or error.
+        Pass a PayloadArchive as archive to keep every raw response for later replay, and
+        a CapitalIndex as capitals to look capital cities up without name resolution.
+        """
         self.api_key = api_key # Store the API key for authentication
         self.url = "https://api.openweathermap.org/data/2.5/weather" # OpenWeatherMap API URL
+        self.group_url = "https://api.openweathermap.org/data/2.5/group" # Several city IDs at once
+        self.timeout = timeout # Seconds to wait for the API before giving up
+        self.pool_size = pool_size # Connections kept open, also the default worker count
+        self.retries = retries # Retries on connection errors, 429 and 5xx
+        self.backoff_factor = backoff_factor # Base of the exponential backoff between retries
+        self.cache = cache # Optional response cache, None fetches every time
+        self.rate_limiter = rate_limiter # Optional shared call budget
+        self.rate_limit_retries = rate_limit_retries # 429s retried when rate limited
+        self.in_flight = SingleFlight() # Lookups currently running, by normalised city
+        self.archive = archive # Optional store of raw responses, None keeps nothing
+        self.capitals = capitals # Optional local index of capital city locations
+        self._session = None # Created on first use, see the session property
+        self._session_lock = threading.Lock()
 
-    def get_weather_data(self, city=str) -> dict:
-        """Fetch weather data from the API for the specified city."""
+    @property
+    def session(self) -> "requests.Session":
+        """Pooled HTTP session, created (and requests imported) on first use."""
+
+        if self._session is None:
+            with self._session_lock: # Threads in get_weather_many may race to create it
+                if self._session is None:
+                    # With a rate limiter, _send retries so every attempt takes a token
+                    limited = self.rate_limiter is not None
+                    self._session = self._build_session(
+                        self.pool_size, 0 if limited else self.retries, self.backoff_factor,
+                        respect_retry_after=not limited)
+        return self._session
+
+    @staticmethod
+    def _build_session(pool_size: int, retries: int, backoff_factor: float,
+                       statuses: tuple = RETRY_STATUSES,
+                       respect_retry_after: bool = True) -> "requests.Session":
+        """Create a keep-alive session with a sized connection pool and retry policy."""
+
+        import requests # Used to make HTTP requests
+        from requests.adapters import HTTPAdapter # Used to size the pool and attach retries
+        from urllib3.util.retry import Retry # Used to retry failed requests with backoff
+
+        retry = Retry(
+            total=retries, # Maximum number of retries before giving up
+            backoff_factor=backoff_factor, # Sleep backoff_factor * 2 ** (retry - 1) between tries
+            status_forcelist=statuses, # Only retry statuses that may succeed later
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=respect_retry_after, # Otherwise 429s retry regardless
+            raise_on_status=False # Return the last response so raise_for_status reports it
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter) # Reuse connections for every request to the API
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        """Close the session and its pooled connections, and the cache and archive if set."""
+        if self._session is not None:
+            self._session.close()
+        if self.cache:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def __enter__(self):
+        """Allow the service to be used as a context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the connection pool when leaving the with block."""
+        self.close()
+
+    def fetch_weather(self, city: str) -> dict:
+        """Fetch weather data for the city, raising WeatherServiceError if the lookup fails."""
+        return self.get_record(city).to_dict()
+
+    @instrumentation.timed("fetch_weather")
+    def get_record(self, city: str) -> WeatherRecord:
+        """Return the city's WeatherRecord from the cache or the API, raising WeatherServiceError.
+
+        Local time isn't formatted until the record is output.
+        """
+
+        record = self._cached_record(city) # Serve fresh cached data without calling the API
+        if record is not None:
+            return record
+        # Callers asking for the same city at the same time wait for one request
+        return self.in_flight.do(normalize_query(city), self._fetch_and_cache, city)
+
+    def _cached_record(self, city: str):
+        """Return the city's cached WeatherRecord, or None if it isn't cached."""
+
+        cached = self.cache.get(city) if self.cache else None
+        if cached is None:
+            return None
+        try:
+            return WeatherRecord(**cached)
+        except TypeError: # Formatted output cached by an older version, fetch again
+            return None
+
+    def _fetch_and_cache(self, city: str) -> WeatherRecord:
+        """Fetch the city's record from the API, storing it in the cache if there is one."""
+
+        record = self.fetch_record(city)
+        if self.cache:
+            self.cache.set(city, dataclasses.asdict(record))
+        return record
+
+    def fetch_record(self, city: str) -> WeatherRecord:
+        """Request weather for the city as a WeatherRecord, raising WeatherServiceError on failure.
+
+        Unlike fetch_weather this skips the cache and leaves local time unformatted.
+        """
+        return self._parse_record(self.fetch_payload(city))
+
+    def get_payload(self, city: str) -> dict:
+        """Return the city's raw OWM weather JSON, sharing the request with concurrent callers."""
+        return self.in_flight.do(("raw", normalize_query(city)), self.fetch_payload, city)
+
+    def fetch_payload(self, city: str) -> dict:
+        """Request the city's raw OWM weather JSON, raising WeatherServiceError on failure.
+
+        Capitals in the capitals index are requested by ID or coordinates instead of name,
+        and a city the API can't find suggests any capitals it may be a typo of.
+        """
 
         # Provides the parameters for OpenWeatherMap API request
         owm_queries = {
-            "q": city,  # City name
             "appid": self.api_key,  # API key
             "units": "metric",  # Use metric units for temperature
             "lang": "en"  # Set language to English
         }
+        capital = self.capitals.resolve(city) if self.capitals is not None else None
+        if capital is None:
+            owm_queries["q"] = city # City name, resolved by the API
+        elif capital.id is not None:
+            owm_queries["id"] = capital.id
+        else: # No ID known, coordinates are still unambiguous
+            owm_queries["lat"], owm_queries["lon"] = capital.lat, capital.lon
+        try:
+            payload = self._get_json(self.url, owm_queries)
+        except WeatherServiceError as e:
+            suggestions = self._suggest_capitals(city, e) if capital is None else ""
+            if suggestions: # Not found, and close to a capital's name
+                raise WeatherServiceError(f"{e} (did you mean {suggestions}?)") from e.__cause__
+            raise
+        if capital is not None: # Coordinates can resolve to a district, keep the capital's name
+            payload["name"] = capital.name
+        if self.archive is not None:
+            self.archive.append(payload, city) # Replay finds it by the query as well as the name
+        return payload
+
+    def _suggest_capitals(self, city: str, error: WeatherServiceError) -> str:
+        """Return the capitals a city the API couldn't find (404) may be a typo of, or ""."""
 
+        response = getattr(error.__cause__, "response", None) # Set for HTTP errors only
+        if self.capitals is None or getattr(response, "status_code", None) != 404:
+            return ""
+        _, suggestions = self.capitals.lookup(city)
+        return " or ".join(capital.name for capital in suggestions)
+
+    def _get_json(self, url: str, owm_queries: dict) -> dict:
+        """Send a GET request to the API and return the decoded JSON, raising WeatherServiceError."""
+
+        import requests # Already loaded by the session, needed for its exception types
         # Use try/except to make API request in case of errors
-        response = None  # Initialize response to None
         try:
-            # Send web request to OpenWeatherMap API with above parameters
-            response = requests.get(self.url, params=owm_queries, timeout=10)
+            # Send web request to OpenWeatherMap API with above parameters over the pooled session,
+            # timed from sending until the body is read (includes DNS/TLS on a new connection)
+            response = self._send(url, owm_queries)
+            if instrumentation.enabled: # Time to the response headers, the rest is the body
+                instrumentation.record("http.headers", response.elapsed.total_seconds())
             # Returns a HTTP error if the request was unsuccessful, returns nothing otherwise
             response.raise_for_status()
-        # Prints relevant error message and returns empty dictionary if the request was unsuccessful
-            data = response.json() # Assign response data to a variable
-            # Return dictionary from json variable
-            return {
-                "city": data["name"],  # City name
-                "temperature": data["main"]["temp"],  # Temperature in Celsius
-                "humidity": data["main"]["humidity"],  # Humidity percentage
-                "condition": data["weather"][0]["description"],  # Weather description
-                "local_time": convert_time(data["dt"], data["coord"])  # Local time of last update
-            }
-        except requests.ConnectionError:
-            print("Error: Unable to connect to the OpenWeatherMap API")
-            return {}
-        except requests.Timeout:
-            print("Error: Request timed out (10 seconds)")
-            return {}
+            with instrumentation.timer("json_parse"):
+                # Decode the raw bytes, skipping requests' text decoding and charset detection
+                return fast_json.loads(response.content)
+        # Converts each failure into a WeatherServiceError with a user friendly message
+        except requests.ConnectionError as e:
+            raise WeatherServiceError("Error: Unable to connect to the OpenWeatherMap API") from e
+        except requests.Timeout as e:
+            raise WeatherServiceError(f"Error: Request timed out ({self.timeout} seconds)") from e
         except requests.HTTPError as e:
-            print(f"HTTP Error: {e.response.status_code} - {e.response.reason}")
-            return {}
+            raise WeatherServiceError(
+                f"HTTP Error: {e.response.status_code} - {e.response.reason}") from e
         except requests.RequestException as e: # Catch all other request-related errors
-            print(f"Network Error: {e}")
+            raise WeatherServiceError(f"Network Error: {e}") from e
+        except fast_json.JSONDecodeError as e:
+            raise WeatherServiceError(f"Data Error: Invalid JSON in response ({e})") from e
+
+    def _send(self, url: str, owm_queries: dict) -> "requests.Response":
+        """Send the request, waiting for the rate limiter and pausing on 429s if there is one.
+
+        Without a rate limiter urllib3 retries failures inside session.get. With one, the
+        session doesn't retry and failures are retried here, each attempt taking a token.
+        """
+
+        import requests # Already loaded by the session, needed for its exception types
+        attempt = retried = 0 # 429s and other failures retried so far
+        while True:
+            if self.rate_limiter:
+                with instrumentation.timer("rate_limit_wait"):
+                    self.rate_limiter.acquire() # Queue until the call fits in the budget
+            try:
+                with instrumentation.timer("http"):
+                    response = self.session.get(url, params=owm_queries, timeout=self.timeout)
+            except requests.ConnectionError:
+                if not self.rate_limiter or retried >= self.retries:
+                    raise
+                retried += 1
+                time.sleep(self.backoff_factor * 2 ** (retried - 1))
+                continue
+            if not self.rate_limiter:
+                return response
+            if response.status_code == 429 and attempt < self.rate_limit_retries:
+                # Over quota, hold back every caller sharing the limiter, then try again
+                self.rate_limiter.pause(parse_retry_after(response.headers.get("Retry-After")))
+                attempt += 1
+            elif response.status_code in RETRY_STATUSES and response.status_code != 429 \
+                    and retried < self.retries: # Server error, back off like urllib3 would
+                retried += 1
+                time.sleep(self.backoff_factor * 2 ** (retried - 1))
+            else:
+                return response
+
+    @staticmethod
+    def _parse_record(data: dict) -> WeatherRecord:
+        """Build a WeatherRecord from one OWM weather object, raising WeatherServiceError."""
+
+        try:
+            return WeatherRecord.from_owm(data)
+        except (KeyError, IndexError) as e:
+            raise WeatherServiceError(f"Data Error: Missing expected field {e}") from e
+
+    @instrumentation.timed("get_weather_data")
+    def get_weather_data(self, city=str) -> dict:
+        """Fetch weather data from the API for the specified city."""
+
+        try:
+            return self.fetch_weather(city)
+        # Prints relevant error message and returns empty dictionary if the request was unsuccessful
+        except WeatherServiceError as e:
+            print(e)
             return {}
-        except KeyError as e:
-            print(f"Data Error: Missing expected field {e}")
+
+    def get_weather_many(self, cities: list, max_workers: int = None, raw: bool = False) -> list:
+        """Fetch weather for many cities concurrently, returning CityResults in input order.
+
+        Each result's data is a WeatherRecord, so local time is only formatted on output.
+        With raw set, it's the OWM JSON as received, uncached, for processing elsewhere
+        (see pipeline.py). Cities repeated in the list are only fetched once.
+        """
+
+        if not cities: # Nothing to fetch, avoid starting a pool
+            return []
+        keys = [normalize_query(city) for city in cities]
+        unique = {} # Normalised query to the first city asking for it
+        for city, key in zip(cities, keys):
+            unique.setdefault(key, city)
+        max_workers = max_workers or self.pool_size # Match the connection pool by default
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+            # map preserves input order regardless of which request finishes first
+            fetched = dict(zip(unique, pool.map(self._fetch_result, unique.values(),
+                                                [raw] * len(unique))))
+        return [fetched[key]._replace(city=city) for city, key in zip(cities, keys)]
+
+    def get_weather_bulk(self, cities: list, index: "CityIndex", max_workers: int = None) -> list:
+        """Fetch many cities using the group endpoint, returning CityResults of WeatherRecords.
+
+        Results are in input order. Cities the index can resolve are fetched GROUP_SIZE
+        IDs per request, any others fall back to one name lookup each through
+        get_weather_many.
+        """
+
+        results = [None] * len(cities)
+        by_id = {} # City ID to the positions of cities that resolved to it
+        for pos, city in enumerate(cities):
+            cached = self._cached_record(city)
+            if cached is not None:
+                results[pos] = CityResult(city, cached, None)
+                continue
+            city_id = index.resolve(city)
+            if city_id is not None:
+                by_id.setdefault(city_id, []).append(pos)
+
+        ids = list(by_id)
+        chunks = [ids[i:i + GROUP_SIZE] for i in range(0, len(ids), GROUP_SIZE)]
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(max_workers or self.pool_size,
+                                                    len(chunks))) as pool:
+                # Each ID's first query is archived with its response so replay can find it
+                queries = {city_id: cities[positions[0]] for city_id, positions in by_id.items()}
+                results_by_chunk = pool.map(lambda chunk: self._fetch_group(chunk, queries), chunks)
+                for chunk, (weather, error) in zip(chunks, results_by_chunk):
+                    for city_id in chunk: # Split the group response back out to each city
+                        record = weather.get(city_id)
+                        city_error = error or (None if record else
+                                               f"Data Error: No data returned for city id {city_id}")
+                        for pos in by_id[city_id]:
+                            results[pos] = CityResult(cities[pos], record, city_error)
+                            if record and self.cache:
+                                self.cache.set(cities[pos], dataclasses.asdict(record))
+
+        # Anything not cached or resolved is looked up by name
+        missing = [pos for pos, result in enumerate(results) if result is None]
+        fallback = self.get_weather_many([cities[pos] for pos in missing], max_workers)
+        for pos, result in zip(missing, fallback):
+            results[pos] = result
+        return results
+
+    def _fetch_group(self, ids: list, queries: dict = None) -> tuple:
+        """Fetch up to GROUP_SIZE city IDs in one request, returning ({id: WeatherRecord}, error).
+
+        queries maps IDs to the query archived with their response, if archiving.
+        """
+
+        owm_queries = {
+            "id": ",".join(str(city_id) for city_id in ids), # Comma separated city IDs
+            "appid": self.api_key,
+            "units": "metric",
+            "lang": "en"
+        }
+        try:
+            data = self._get_json(self.group_url, owm_queries)
+            weather = {}
+            for item in data.get("list", []):
+                if self.archive is not None: # Archived one city at a time, like name lookups
+                    self.archive.append(item, (queries or {}).get(item.get("id")))
+                try:
+                    weather[item["id"]] = self._parse_record(item)
+                except (KeyError, WeatherServiceError): # Leave bad entries out, reported as missing
+                    continue
+            return weather, None
+        except WeatherServiceError as e:
+            return {}, str(e)
+
+    def _fetch_result(self, city: str, raw: bool = False) -> CityResult:
+        """Fetch one city, capturing any error in the result instead of raising."""
+
+        try:
+            return CityResult(city, self.get_payload(city) if raw else self.get_record(city),
+                              None)
+        except WeatherServiceError as e:
+            return CityResult(city, None, str(e))
+
+
+class AsyncWeatherService:
+    """Asyncio front end for WeatherService with a cap on concurrent requests.
+
+    No async HTTP client is in requirements.txt, so each request runs the pooled
+    requests session in a worker thread via asyncio.to_thread.
+    """
+
+    def __init__(self, api_key: str, concurrency: int = 10, **kwargs):
+        """Create the underlying WeatherService and the concurrency semaphore."""
+        import asyncio # Only needed by the async variant
+        # Size the connection pool to the concurrency so no request waits for a connection
+        kwargs.setdefault("pool_size", concurrency)
+        self.service = WeatherService(api_key, **kwargs)
+        self.semaphore = asyncio.Semaphore(concurrency) # Limits requests in flight at once
+        self.in_flight = AsyncSingleFlight() # Duplicate tasks don't take a slot or a thread
+
+    async def close(self):
+        """Close the underlying session."""
+        self.service.close()
+
+    async def __aenter__(self):
+        """Allow the service to be used as an async context manager."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the connection pool when leaving the async with block."""
+        await self.close()
+
+    async def fetch_weather(self, city: str) -> dict:
+        """Fetch weather for the city, raising WeatherServiceError if the lookup fails."""
+        return (await self.get_record(city)).to_dict()
+
+    async def get_record(self, city: str) -> WeatherRecord:
+        """Return the city's WeatherRecord, raising WeatherServiceError if the lookup fails.
+
+        Tasks asking for the same city at the same time wait for one request.
+        """
+        return await self.in_flight.do(normalize_query(city), self._fetch, city)
+
+    async def _fetch(self, city: str) -> WeatherRecord:
+        """Fetch the city's record in a worker thread once a slot is free."""
+        import asyncio
+        async with self.semaphore:
+            return await asyncio.to_thread(self.service.get_record, city)
+
+    async def get_weather_data(self, city: str) -> dict:
+        """Fetch weather for the city, printing errors and returning {} like WeatherService."""
+        try:
+            return await self.fetch_weather(city)
+        except WeatherServiceError as e:
+            print(e)
             return {}
+
+    async def get_weather_many(self, cities: list) -> list:
+        """Fetch weather for many cities concurrently, returning CityResults of WeatherRecords."""
+
+        async def fetch_result(city):
+            """Fetch one city, capturing any error in the result instead of raising."""
+            try:
+                return CityResult(city, await self.get_record(city), None)
+            except WeatherServiceError as e:
+                return CityResult(city, None, str(e))
+
+        import asyncio
+        # gather returns results in the order the coroutines were passed in
+        return list(await asyncio.gather(*(fetch_result(city) for city in cities)))
@@ -0,0 +1,133 @@
+"""Tests archive.py, the raw response archive and replay."""
+
+import gzip
+import json
+import main
+import records
+from archive import PayloadArchive
+from handlers import DataOutput
+from mock_server import MockOWMServer
+from weather_service import WeatherService
+
+def payloads() -> list:
+    """Twelve observations, ten minutes apart, rotating through three cities."""
+    mock = MockOWMServer()
+    items = []
+    for i in range(12):
+        item = mock.weather_json(["London", "Paris", "Buenos Aires"][i % 3])
+        item["dt"] = 1609459200 + i * 600
+        items.append(item)
+    return items
+
+class ListOutput(DataOutput):
+    """Collects output records in a list."""
+
+    def __init__(self):
+        """Start with nothing output."""
+        super().__init__()
+        self.records = []
+
+    def output(self, data):
+        """Keep the record."""
+        self.records.append(data)
+
+def test_segments_blocks_and_indexed_queries(tmp_path):
+    """Payloads should be split over gzip segments and found by city and time via the index."""
+
+    items = payloads()
+    with PayloadArchive(str(tmp_path), segment_bytes=600, block_records=4) as archive:
+        for item in items:
+            archive.append(item)
+        assert len(archive) == 12
+        assert list(archive.query()) == items
+        london = list(archive.query(["london"], start=items[3]["dt"], end=items[9]["dt"]))
+        assert london == [items[3], items[6]]
+        assert list(archive.query(["buenos aires", "Paris"])) == \
+            list(archive.scan(["buenos aires", "Paris"]))
+        assert list(archive.query(end=items[0]["dt"])) == []
+
+    segments = sorted(tmp_path.glob("segment-*.jsonl.gz"))
+    assert len(segments) > 1 # Rolled over at segment_bytes
+    with gzip.open(segments[0], "rt", encoding="utf-8") as f: # Each segment is a normal .gz file
+        assert json.loads(f.readline()) == items[0]
+
+def test_reopened_archive_appends(tmp_path):
+    """Reopening should keep the index and add to the last segment."""
+
+    items = payloads()
+    with PayloadArchive(str(tmp_path)) as archive:
+        for item in items[:5]:
+            archive.append(item)
+    with PayloadArchive(str(tmp_path)) as archive:
+        for item in items[5:]:
+            archive.append(item)
+        assert list(archive.query()) == items
+    assert len(list(tmp_path.glob("segment-*"))) == 1
+
+def test_replay_through_handler(tmp_path, monkeypatch):
+    """Replay should output WeatherRecords for matching payloads, skipping unusable ones."""
+
+    monkeypatch.setattr(records, "convert_time", lambda dt, coords: str(dt))
+    items = payloads()
+    handler = ListOutput()
+    with PayloadArchive(str(tmp_path)) as archive:
+        archive.append({"cod": 500, "message": "internal error"}) # Error bodies have no name
+        for item in items:
+            archive.append(item)
+        assert archive.replay(handler, ["paris"]) == 4
+    assert [r.to_dict()["local_time"] for r in handler.records] == \
+        [str(item["dt"]) for item in items[1::3]]
+
+def test_service_archives_responses(tmp_path):
+    """Every raw response fetched by the service should be archived."""
+
+    archive = PayloadArchive(str(tmp_path))
+    with MockOWMServer() as server, WeatherService("KEY", archive=archive) as ws:
+        ws.url = server.weather_url
+        ws.get_weather_many(["london", "rome"])
+    # Closing the service closed the archive, reopen it to read
+    with PayloadArchive(str(tmp_path)) as archive:
+        assert sorted(item["name"] for item in archive.query()) == ["London", "Rome"]
+
+def test_replay_flag_needs_no_api(monkeypatch, capsys, tmp_path):
+    """--replay should write archived data to the output without an API key."""
+
+    monkeypatch.delenv("OWM_API_KEY", raising=False)
+    monkeypatch.setattr("dotenv.load_dotenv", lambda: None)
+    with PayloadArchive(str(tmp_path / "archive")) as archive:
+        for item in payloads():
+            archive.append(item)
+    out_file, tee_file = tmp_path / "out.csv", tmp_path / "tee.jsonl"
+
+    assert main.main(["--replay", str(tmp_path / "archive"), "-f", "csv", "-o", str(out_file),
+                      "--since", "2021-01-01", "--until", str(1609459200 + 1800),
+                      "--tee", f"jsonl={tee_file}"]) == 0
+    rows = out_file.read_text(encoding="utf-8").splitlines()
+    assert [row.split(",")[0] for row in rows] == ["city", "London", "Paris", "Buenos Aires"]
+    assert [json.loads(line)["city"] for line in tee_file.read_text(encoding="utf-8").splitlines()] \
+        == ["London", "Paris", "Buenos Aires"]
+    assert main.main(["--replay", str(tmp_path / "missing")]) == 1
+    assert "No archive found" in capsys.readouterr().out
+
+def test_collect_then_replay_same_cities(monkeypatch, tmp_path):
+    """Replaying with the cities file used to collect should find every city it fetched."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    cities = tmp_path / "cities.txt"
+    # A country code not in the API's name, an accented capital, and a multi-word name
+    cities.write_text("Manchester, GB\nbogota\nBuenos Aires\n", encoding="utf-8")
+    archive_dir, out_file = tmp_path / "archive", tmp_path / "out.csv"
+    with MockOWMServer() as server:
+        init = WeatherService.__init__
+        def mock_init(self, *args, **kwargs):
+            """Point the service at the mock server."""
+            init(self, *args, **kwargs)
+            self.url = server.weather_url
+        monkeypatch.setattr(WeatherService, "__init__", mock_init)
+        assert main.main(["--archive", str(archive_dir), "--cities", str(cities)]) == 0
+
+    assert main.main(["--replay", str(archive_dir), "--cities", str(cities),
+                      "-f", "csv", "-o", str(out_file)]) == 0
+    rows = out_file.read_text(encoding="utf-8").splitlines()[1:]
+    # Archived in the order the workers finished, the mock names cities after the query
+    assert sorted(row.split(",")[0] for row in rows) == ["Bogotá", "Buenos Aires", "Manchester  Gb"]
@@ -0,0 +1,92 @@
+"""Tests cache.py module and its use by WeatherService."""
+
+import pytest
+import cache
+from cache import MemoryCache, SQLiteCache, normalize_query
+from weather_service import WeatherService
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces time.time in the cache module with a controllable clock."""
+
+    class Clock:
+        """Fake clock that only moves when told to."""
+        now = 1000.0
+        def time(self):
+            """Return the current fake time."""
+            return self.now
+    fake = Clock()
+    monkeypatch.setattr(cache.time, "time", fake.time)
+    return fake
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """Builds either backend so each test runs against both."""
+
+    def factory(**kwargs):
+        """Create a cache of the parametrised type."""
+        if request.param == "memory":
+            return MemoryCache(**kwargs)
+        return SQLiteCache(tmp_path / "cache.db", **kwargs)
+    return factory
+
+def test_normalize_query():
+    """Equivalent queries should share a key."""
+    assert normalize_query(" Buenos  Aires, AR ") == "buenos,aires,ar"
+    assert normalize_query("buenos,aires,ar") == "buenos,aires,ar"
+
+def test_hit_miss_and_stale(make_cache, clock):
+    """Entries should be served until the TTL passes, then counted as stale."""
+
+    c = make_cache(ttl=600)
+    assert c.get("london") is None # Miss
+    c.set("london", {"city": "London"})
+    assert c.get("LONDON ") == {"city": "London"} # Hit through normalisation
+    clock.now += 601
+    assert c.get("london") is None # Stale
+    assert c.stats() == {"hits": 1, "misses": 1, "stale": 1, "size": 0}
+    c.close()
+
+def test_lru_eviction(make_cache, clock):
+    """The least recently used entry should be evicted when over max_entries."""
+
+    c = make_cache(max_entries=2)
+    c.set("a", {"city": "A"})
+    clock.now += 1
+    c.set("b", {"city": "B"})
+    clock.now += 1
+    c.get("a") # a is now more recently used than b
+    clock.now += 1
+    c.set("c", {"city": "C"})
+    assert c.get("b") is None
+    assert c.get("a") == {"city": "A"}
+    assert c.get("c") == {"city": "C"}
+    c.close()
+
+def test_sqlite_cache_survives_restart(tmp_path, clock):
+    """A new SQLiteCache on the same file should see entries stored by the old one."""
+
+    first = SQLiteCache(tmp_path / "cache.db")
+    first.set("paris", {"city": "Paris", "temperature": 12.5})
+    first.close()
+    second = SQLiteCache(tmp_path / "cache.db")
+    assert second.get("paris") == {"city": "Paris", "temperature": 12.5}
+    second.close()
+
+def test_weather_service_uses_cache(requests_mock):
+    """Repeat lookups for the same city should be answered without calling the API."""
+
+    requests_mock.get("https://api.openweathermap.org/data/2.5/weather", json={
+        "coord": {"lon": 0, "lat": 0},
+        "weather": [{"description": "clear sky"}],
+        "main": {"temp": 22.5, "humidity": 55},
+        "dt": 1609459200,
+        "name": "TestCity"
+    })
+    with WeatherService(api_key="KEY", cache=MemoryCache()) as ws:
+        first = ws.get_weather_data("test city")
+        second = ws.get_weather_data("Test,City")
+        assert ws.cache.stats()["hits"] == 1
+
+    assert first == second
+    assert requests_mock.call_count == 1
@@ -0,0 +1,95 @@
+"""Tests city_index.py module."""
+
+import gzip
+import json
+from city_index import CAPITALS_PATH, DATA_DIR, Capital, CapitalIndex, read_capitals
+from city_index import CityIndex
+from mock_server import MockOWMServer
+from weather_service import WeatherService
+
+CITY_LIST = [
+    {"id": 2643743, "name": "London", "state": "", "country": "GB",
+     "coord": {"lon": -0.12574, "lat": 51.50853}},
+    {"id": 6058560, "name": "London", "state": "ON", "country": "CA",
+     "coord": {"lon": -81.23304, "lat": 42.98339}},
+    {"id": 3435910, "name": "Buenos Aires", "state": "", "country": "AR",
+     "coord": {"lon": -58.37723, "lat": -34.61315}},
+]
+
+def test_resolve_from_city_list(tmp_path):
+    """Names should resolve with or without country, ambiguous names shouldn't resolve."""
+
+    path = tmp_path / "city.list.json.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(CITY_LIST, f)
+    index = CityIndex.from_city_list(path)
+
+    assert index.resolve("Buenos Aires") == 3435910
+    assert index.resolve("buenos,aires,ar") == 3435910
+    assert index.resolve("london gb") == 2643743
+    assert index.resolve("london,on,ca") == 6058560
+    assert index.resolve("london") is None, "Two Londons, let the API decide"
+    assert index.resolve("atlantis") is None
+
+def test_save_and_load(tmp_path):
+    """A saved index should load back with the same entries."""
+
+    list_path = tmp_path / "city.list.json"
+    list_path.write_text(json.dumps(CITY_LIST), encoding="utf-8")
+    index = CityIndex.from_city_list(list_path)
+    index.save(tmp_path / "index.json")
+
+    loaded = CityIndex.load(tmp_path / "index.json")
+    assert loaded.ids == index.ids
+    assert len(loaded) == len(index)
+
+def test_bundled_capitals_match_source():
+    """The bundled binary index should be the one built from data/capitals.csv."""
+
+    capitals = read_capitals(f"{DATA_DIR}/capitals.csv")
+    with open(CAPITALS_PATH, "rb") as f:
+        assert f.read() == CapitalIndex.build(capitals)
+    index = CapitalIndex()
+    assert len(index) == len(capitals)
+    assert sorted(index[i] for i in range(len(index))) == sorted(capitals)
+    index.close()
+
+def test_capital_lookups():
+    """Capitals should resolve with accents folded, by prefix, and by country or state."""
+
+    index = CapitalIndex()
+    assert index.resolve("bogota").name == "Bogotá"
+    assert index.resolve("buenos,aires") == index.resolve("Buenos Aires, AR")
+    assert index.resolve("washington,dc,us").state == "DC"
+    assert index.resolve("ndjamena").name == "N'Djamena"
+    assert index.resolve("london,ca") is None # Wrong country
+    assert [c.name for c in index.complete("san")][:3] == ["San José", "San Marino", "San Salvador"]
+    assert index.complete("zz") == []
+
+def test_typos_are_suggested_not_real_cities():
+    """Near misses of capitals get suggestions, other cities and other countries don't."""
+
+    index = CapitalIndex()
+    assert index.lookup("londn") == (None, [index.resolve("london")])
+    assert [c.name for c in index.lookup("tokio")[1]] == ["Tokyo"]
+    assert index.lookup("paris,us") == (None, []) # A real Paris outside France
+    assert index.lookup("melbourne") == (None, [])
+
+def test_custom_capitals_with_ids(tmp_path):
+    """IDs should round trip through the binary format, missing ones as None."""
+
+    path = tmp_path / "capitals.bin"
+    path.write_bytes(CapitalIndex.build([Capital("Paris", "FR", "", 48.85, 2.35, 2988507),
+                                         Capital("Rome", "IT", "", 41.89, 12.48, None)]))
+    index = CapitalIndex(str(path))
+    assert index.resolve("paris").id == 2988507
+    assert index.resolve("rome").id is None
+
+def test_service_queries_capitals_by_coordinates():
+    """Capitals should be requested by coordinates and keep the capital's name."""
+
+    with MockOWMServer() as server, WeatherService("KEY", capitals=CapitalIndex()) as ws:
+        ws.url = server.weather_url
+        assert ws.get_weather_data("buenos,aires")["city"] == "Buenos Aires"
+        assert ws.get_weather_data("springfield")["city"] == "Springfield" # Not a capital
+        assert server.requests == {"-34.61,-58.38": 1, "springfield": 1}
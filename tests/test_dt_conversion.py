@@ -1,5 +1,6 @@
 """Test cases for dt_conversion module. Refer to 'Testing' in Readme for instructions."""
 
+import pytest
 import dt_conversion as dtc
 
 
@@ -19,7 +20,8 @@ def test_get_timezone_invalid_coords(capsys, monkeypatch):
         def timezone_at(self, lat, lng):
             """Return None for any coordinates."""
             return None
-    monkeypatch.setattr(dtc, "TimezoneFinder", lambda: DummyTF())
+    monkeypatch.setattr(dtc, "_finder", DummyTF()) # Replace the shared finder instance
+    dtc.clear_timezone_cache() # Make sure (0, 0) isn't answered from an earlier cached lookup
 
     tz = dtc.get_timezone({"lat": 0, "lon": 0})
     captured = capsys.readouterr()
@@ -34,3 +36,91 @@ def test_convert_time(monkeypatch):
     result = dtc.convert_time(1609459200, {"lat": 0, "lon": 0})
     # Format is "%d-%b-%y %I:%M %p %Z", so we expect: 01-Jan-21 12:00 AM UTC
     assert result == "01-Jan-21 12:00 AM UTC"
+
+def test_get_finder_is_shared(monkeypatch):
+    """get_finder should only build one TimezoneFinder per process."""
+
+    created = [] # Records each time the fake finder class is constructed
+    monkeypatch.setattr(dtc, "_finder", None)
+    monkeypatch.setattr("timezonefinder.TimezoneFinder", lambda: created.append(1) or object())
+
+    first = dtc.get_finder()
+    second = dtc.get_finder()
+    assert first is second
+    assert len(created) == 1
+
+def test_get_timezone_cache_hits(monkeypatch):
+    """Repeat lookups for the same (rounded) coordinates should be served from the cache."""
+
+    class CountingTF:
+        """Dummy TimezoneFinder that counts lookups."""
+        calls = 0
+        def timezone_at(self, lat, lng):
+            """Return a fixed timezone and record the call."""
+            CountingTF.calls += 1
+            return "Europe/London"
+    monkeypatch.setattr(dtc, "_finder", CountingTF())
+    dtc.clear_timezone_cache()
+
+    assert dtc.get_timezone({"lat": 51.50853, "lon": -0.12574}) == "Europe/London"
+    # Differs only past the rounding precision so should share the cache entry
+    assert dtc.get_timezone({"lat": 51.508531, "lon": -0.125741}) == "Europe/London"
+    info = dtc.timezone_cache_info()
+    assert CountingTF.calls == 1
+    assert info["timezone"]["hits"] == 1
+    assert info["timezone"]["misses"] == 1
+    dtc.clear_timezone_cache() # Don't leak the fake timezone into other tests
+
+def test_convert_times_batch_matches_convert_time():
+    """Batch conversion should give the same strings as convert_time, including across DST."""
+
+    coords = [
+        {"lat": 51.5085, "lon": -0.1257}, # London
+        {"lat": -33.8679, "lon": 151.2073}, # Sydney
+        {"lat": 40.7143, "lon": -74.006}, # New York
+        {"lat": 0, "lon": 0} # Open ocean, Etc/GMT
+    ]
+    # Timestamps either side of northern and southern hemisphere DST changes
+    stamps = [1609459200, 1616893200, 1617458400, 1636261200, 1720000000.7]
+    unix_dts = [ts for ts in stamps for _ in coords]
+    batch_coords = coords * len(stamps)
+
+    result = dtc.convert_times_batch(unix_dts, batch_coords)
+    expected = [dtc.convert_time(ts, c) for ts, c in zip(unix_dts, batch_coords)]
+    assert result == expected
+
+def test_convert_times_batch_accepts_arrays():
+    """Batch conversion should accept an (N, 2) lat/lon array and reject mismatched lengths."""
+
+    assert dtc.convert_times_batch([1609459200], [[51.5085, -0.1257]]) == ["01-Jan-21 12:00 AM GMT"]
+    assert dtc.convert_times_batch([], []) == []
+    with pytest.raises(ValueError):
+        dtc.convert_times_batch([1, 2], [[0, 0]])
+
+def test_get_timezone_thread_safe():
+    """Lookups from many threads should match the same lookups made one at a time."""
+
+    from concurrent.futures import ThreadPoolExecutor
+    coords = [{"lat": lat + 0.37, "lon": lon + 0.61}
+              for lat in range(-60, 70, 7) for lon in range(-180, 180, 11)]
+    dtc.clear_timezone_cache()
+    expected = [dtc.get_timezone(c) for c in coords]
+    dtc.clear_timezone_cache() # Make the threads do their own lookups
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        assert list(pool.map(dtc.get_timezone, coords)) == expected
+
+def test_timezone_unknown_to_pytz_falls_back(capsys, monkeypatch):
+    """A timezone pytz doesn't know should fall back to UTC instead of raising when formatting."""
+
+    class NewZoneTF:
+        """Dummy TimezoneFinder returning a zone newer than pytz's data."""
+        def timezone_at(self, lat, lng):
+            """Return a timezone name pytz can't load."""
+            return "America/Not_Yet_In_Pytz"
+    monkeypatch.setattr(dtc, "_finder", NewZoneTF())
+    dtc.clear_timezone_cache()
+
+    assert dtc.convert_time(1609459200, {"lat": -45.57, "lon": -72.07}) == "01-Jan-21 12:00 AM UTC"
+    assert dtc.convert_times_batch([1609459200], [(-45.57, -72.07)]) == ["01-Jan-21 12:00 AM UTC"]
+    assert "America/Not_Yet_In_Pytz is not known to pytz" in capsys.readouterr().out
+    dtc.clear_timezone_cache() # Don't leave the fallback cached for other tests
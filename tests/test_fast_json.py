@@ -0,0 +1,44 @@
+"""Tests fast_json.py and its use when decoding responses and writing JSON output."""
+
+import json
+import pytest
+import fast_json
+from handlers import JSONOutput
+from weather_service import WeatherService
+
+RECORD = {"city": "São Paulo", "temperature": 24.5, "humidity": 61,
+          "condition": "clear sky", "local_time": "01-Jan-21 09:00 PM -03"}
+
+@pytest.fixture(params=["default", "json"])
+def backend(request, monkeypatch):
+    """Run the test with the installed backend and again with the standard library fallback."""
+    if request.param == "json":
+        monkeypatch.setattr(fast_json, "_orjson", lambda: None)
+    return fast_json.backend()
+
+def test_round_trip_and_same_output(backend):
+    """Both backends should decode bytes and write identical JSON."""
+
+    assert fast_json.loads(b'{"a": [1, 2.5, "x"]}') == {"a": [1, 2.5, "x"]}
+    assert fast_json.dumps(RECORD) == json.dumps(RECORD, separators=(",", ":"), ensure_ascii=False)
+    assert fast_json.dumps(RECORD, 2) == json.dumps(RECORD, indent=2, ensure_ascii=False)
+    assert json.loads(fast_json.dumps(RECORD, 4)) == RECORD
+    with pytest.raises(fast_json.JSONDecodeError):
+        fast_json.loads(b"{not json")
+
+def test_json_output_indent(tmp_path, backend):
+    """JSONOutput should indent by 4 by default and write one line with indent=None."""
+
+    indented, compact = tmp_path / "indented.json", tmp_path / "compact.json"
+    JSONOutput(str(indented)).output(RECORD)
+    JSONOutput(str(compact), indent=None).output(RECORD)
+    assert indented.read_text(encoding="utf-8") == json.dumps(RECORD, indent=4, ensure_ascii=False)
+    assert len(compact.read_text(encoding="utf-8").splitlines()) == 1
+    assert json.loads(compact.read_text(encoding="utf-8")) == RECORD
+
+def test_invalid_json_response(requests_mock, capsys):
+    """A response body that isn't JSON should give a data error, not a crash."""
+
+    requests_mock.get("https://api.openweathermap.org/data/2.5/weather", text="<html>oops</html>")
+    assert WeatherService("KEY").get_weather_data("London") == {}
+    assert "Data Error: Invalid JSON in response" in capsys.readouterr().out
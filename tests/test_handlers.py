@@ -0,0 +1,140 @@
+"""Tests the streaming output handlers in handlers.py."""
+
+import json
+import threading
+import time
+import pytest
+from handlers import CSVStreamOutput, DataOutput, FanOutOutput, JSONLinesOutput
+
+RECORD = {"city": "Paris", "temperature": 12.5, "humidity": 80,
+          "condition": "light rain", "local_time": "01-Jan-21 01:00 AM CET"}
+
+def test_csv_stream_writes_header_once(tmp_path):
+    """Records should be appended under one header, including across reopened handlers."""
+
+    path = tmp_path / "out.csv"
+    with CSVStreamOutput(path) as handler:
+        handler.output(RECORD)
+        handler.output(dict(RECORD, city="Rome"))
+    with CSVStreamOutput(path) as handler: # Appending to an existing file
+        handler.output(dict(RECORD, city="Lima"))
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "city,temperature,humidity,condition,local_time"
+    assert [line.split(",")[0] for line in lines[1:]] == ["Paris", "Rome", "Lima"]
+
+def test_json_lines_flush_and_close(tmp_path, capsys):
+    """JSON Lines records should be on disk after flush and the handler should report on close."""
+
+    path = tmp_path / "out.jsonl"
+    handler = JSONLinesOutput(path, buffer_size=1024 * 1024)
+    handler.output(RECORD)
+    handler.output(dict(RECORD, city="Rome"))
+    handler.flush()
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["city"] for r in records] == ["Paris", "Rome"]
+    handler.close()
+    handler.close() # Closing twice is harmless
+    assert f"Weather data written to {path} (2 records)" in capsys.readouterr().out
+
+def test_stream_does_not_create_unused_file(tmp_path):
+    """A handler that never outputs anything shouldn't create its file."""
+
+    path = tmp_path / "unused.jsonl"
+    with JSONLinesOutput(path):
+        pass
+    assert not path.exists()
+
+class SlowOutput(DataOutput):
+    """Keeps records after a delay, noting which thread wrote them."""
+
+    def __init__(self, delay=0.0, fail_on=None):
+        """Set the delay per record and an optional city that raises."""
+        super().__init__()
+        self.delay = delay
+        self.fail_on = fail_on
+        self.records, self.threads, self.flushes = [], set(), 0
+
+    def output(self, data):
+        """Sleep, then keep the record."""
+        time.sleep(self.delay)
+        if data["city"] == self.fail_on:
+            raise RuntimeError(f"cannot write {data['city']}")
+        self.records.append(data["city"])
+        self.threads.add(threading.current_thread().name)
+
+    def flush(self):
+        """Count flushes."""
+        self.flushes += 1
+
+def test_fan_out_writes_every_sink_in_order(tmp_path):
+    """Each record should reach every sink, in order, from the writer thread."""
+
+    memory = SlowOutput()
+    csv_path, jsonl_path = tmp_path / "out.csv", tmp_path / "out.jsonl"
+    with FanOutOutput([memory, CSVStreamOutput(csv_path), JSONLinesOutput(jsonl_path)],
+                      batch_size=3) as handler:
+        for city in ["Paris", "Rome", "Lima", "Oslo"]:
+            handler.output(dict(RECORD, city=city))
+        handler.flush()
+        assert memory.flushes == 1
+        assert memory.records == ["Paris", "Rome", "Lima", "Oslo"] # Written before flush returns
+    assert memory.threads == {"output-writer"}
+    assert [line.split(",")[0] for line in csv_path.read_text(encoding="utf-8").splitlines()] == \
+        ["city", "Paris", "Rome", "Lima", "Oslo"]
+    assert len(jsonl_path.read_text(encoding="utf-8").splitlines()) == 4
+
+def test_fan_out_overlaps_and_applies_backpressure():
+    """output shouldn't wait for a slow sink until the queue is full."""
+
+    slow = SlowOutput(delay=0.05)
+    handler = FanOutOutput([slow], queue_size=2, batch_size=1)
+    start = time.perf_counter()
+    handler.output(dict(RECORD, city="A"))
+    assert time.perf_counter() - start < 0.04 # Queued, not written
+    for city in "BCDE":
+        handler.output(dict(RECORD, city=city))
+    assert time.perf_counter() - start >= 0.08 # Blocked behind the full queue
+    handler.close()
+    assert slow.records == list("ABCDE")
+
+def test_fan_out_reports_sink_errors():
+    """A failing sink shouldn't stop the others, and its error should reach the caller."""
+
+    failing, healthy = SlowOutput(fail_on="Rome"), SlowOutput()
+    handler = FanOutOutput([failing, healthy])
+    handler.output(dict(RECORD, city="Rome"))
+    handler.output(dict(RECORD, city="Lima"))
+    with pytest.raises(RuntimeError, match="cannot write Rome"):
+        handler.flush()
+    assert healthy.records == ["Rome", "Lima"]
+    handler.close() # Error already reported
+
+def test_fan_out_survives_unformattable_records():
+    """A record that fails to format should be reported without stopping the writer."""
+
+    from records import WeatherRecord
+    sink = SlowOutput()
+    handler = FanOutOutput([sink])
+    # A timestamp too large for datetime fails while formatting local time
+    handler.output(WeatherRecord("Rome", 20.0, 50, "clear sky", 800, 10**20, 41.9, 12.5))
+    handler.output(dict(RECORD, city="Lima"))
+    with pytest.raises(OverflowError):
+        handler.flush()
+    assert sink.records == ["Lima"]
+    handler.close()
+
+def test_fan_out_does_not_hang_if_writer_dies():
+    """output, flush and close should raise instead of blocking once the writer has stopped."""
+
+    def crash():
+        """Stand in for a writer that stops unexpectedly."""
+        raise RuntimeError("writer crashed")
+    sink = SlowOutput()
+    handler = FanOutOutput([sink], queue_size=1)
+    handler._write_batches = crash
+    handler.output(dict(RECORD, city="Rome")) # Starts the writer, which dies
+    with pytest.raises(RuntimeError, match="writer crashed"):
+        handler.output(dict(RECORD, city="Lima")) # Queue is full and nothing will empty it
+    with pytest.raises(RuntimeError, match="thread stopped"):
+        handler.close()
@@ -0,0 +1,65 @@
+"""Tests instrumentation.py module and the stages it times."""
+
+import json
+import pytest
+from instrumentation import Instrumentation, instrumentation
+from handlers import JSONLinesOutput
+from weather_service import WeatherService
+
+@pytest.fixture
+def enabled():
+    """Enables the shared instrumentation for one test and cleans up afterwards."""
+    instrumentation.reset()
+    instrumentation.enable()
+    yield instrumentation
+    instrumentation.disable()
+    instrumentation.reset()
+    instrumentation.callbacks.clear()
+
+def test_disabled_records_nothing():
+    """Timed functions and timers should record nothing until enabled."""
+
+    inst = Instrumentation()
+    double = inst.timed("double")(lambda x: x * 2)
+    assert double(2) == 4
+    with inst.timer("block"):
+        pass
+    assert inst.summary() == {}
+
+def test_timed_timer_and_callbacks():
+    """Enabled instrumentation should count calls and pass durations to callbacks."""
+
+    inst = Instrumentation()
+    seen = [] # Stages passed to the callback
+    inst.add_callback(lambda stage, seconds: seen.append(stage))
+    inst.enable()
+    double = inst.timed("double")(lambda x: x * 2)
+    double(1)
+    double(2)
+    with inst.timer("block"):
+        pass
+
+    summary = inst.summary()
+    assert summary["double"]["count"] == 2
+    assert summary["block"]["count"] == 1
+    assert seen == ["double", "double", "block"]
+    assert json.loads(inst.summary_json()) == summary
+    assert inst.summary_text().splitlines()[0].startswith("stage")
+
+def test_lookup_and_output_stages(enabled, requests_mock, tmp_path, capsys):
+    """A lookup and write should record the HTTP, parsing, timezone and handler stages."""
+
+    requests_mock.get("https://api.openweathermap.org/data/2.5/weather", json={
+        "coord": {"lon": 0, "lat": 0},
+        "weather": [{"description": "clear sky"}],
+        "main": {"temp": 22.5, "humidity": 55},
+        "dt": 1609459200,
+        "name": "TestCity"
+    })
+    with WeatherService(api_key="KEY") as ws, JSONLinesOutput(tmp_path / "out.jsonl") as out:
+        out.output(ws.get_weather_data("TestCity"))
+
+    stages = enabled.summary()
+    for stage in ("get_weather_data", "fetch_weather", "http", "json_parse", "convert_time",
+                  "get_timezone", "output.JSONLinesOutput"):
+        assert stages[stage]["count"] == 1, stage
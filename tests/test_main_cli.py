@@ -1,17 +1,23 @@
 """Smoke tests for main CLI application, the entry point for the application."""
 
 import builtins # Used to mock user input
+import io # Used to fake stdin
+import json # Used to read the stats file
+import sys # Used to replace stdin
 import pytest # Used for testing
 import main # Main application module
-from weather_service import WeatherService # Weather service module
+from handlers import DataOutput # Base class for output handlers
+from records import WeatherRecord, as_dict # Batch lookups output WeatherRecords
+from mock_server import MockOWMServer # Builds OWM shaped weather objects
+from weather_service import CityResult, WeatherService, WeatherServiceError # Weather service module
 
-class FakeOutputHandler:
+class FakeOutputHandler(DataOutput):
     """Simulates terminal output for testing"""
 
     def output(self, data):
         """Provides a fake output for pytest instead of printing to terminal"""
 
-        print(f"OUTPUT: {data}") # This will be captured by pytest
+        print(f"OUTPUT: {as_dict(data)}") # This will be captured by pytest
 
 class FakeInputWriter:
     """Simulates user input sequence for testing"""
@@ -94,3 +100,246 @@ def test_invalid_city_handling(monkeypatch, capsys):
 
     # Assert output contains expected error message for no data found
     assert "Value Error: No data found for the specified city." in output
+
+def fake_fetch_weather(self, city):
+    """Returns fake weather data, failing for the city "nowhere"."""
+
+    if city == "nowhere":
+        raise WeatherServiceError("HTTP Error: 404 - Not Found")
+    return {"city": city, "temperature": 20, "humidity": 50,
+            "condition": "sunny", "local_time": "01-Jan-21 12:00 AM UTC"}
+
+def test_batch_mode_from_file(monkeypatch, capsys, tmp_path):
+    """Batch mode should output every city from the file without prompting and exit 0."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch_weather)
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    # Any prompt would fail the test as there are no inputs to give
+    monkeypatch.setattr(builtins, "input", FakeInputWriter([]))
+    cities = tmp_path / "cities.txt"
+    cities.write_text("London\n\nbuenos aires\n", encoding="utf-8")
+
+    assert main.main(["--cities", str(cities)]) == 0
+    output = capsys.readouterr().out
+    assert "OUTPUT: {'city': 'london'" in output
+    assert "OUTPUT: {'city': 'buenos,aires'" in output
+
+def test_batch_mode_partial_failure_from_stdin(monkeypatch, capsys):
+    """Invalid and failed cities should be reported individually with exit code 2."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch_weather)
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("paris\nnowhere\nr0me\n"))
+
+    assert main.main(["-c", "-", "-f", "terminal", "-w", "2"]) == 2
+    output = capsys.readouterr().out
+    assert "OUTPUT: {'city': 'paris'" in output
+    assert "nowhere: HTTP Error: 404 - Not Found" in output
+    assert "Value Error: r0me: City name must contain letters, spaces or commas only" in output
+
+def test_batch_mode_all_failed(monkeypatch, capsys):
+    """Exit code should be 1 when no city succeeds."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch_weather)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("nowhere\n"))
+
+    assert main.main(["-c", "-"]) == 1
+
+def test_batch_mode_streams_csv(monkeypatch, capsys, tmp_path):
+    """Batch CSV output should hold every city in one file with a single header."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch_weather)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("paris\nrome\nlima\n"))
+    out_file = tmp_path / "out.csv"
+
+    assert main.main(["-c", "-", "-f", "csv", "-o", str(out_file)]) == 0
+    lines = out_file.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "city,temperature,humidity,condition,local_time"
+    assert [line.split(",")[0] for line in lines[1:]] == ["paris", "rome", "lima"]
+    assert f"Weather data written to {out_file} (3 records)" in capsys.readouterr().out
+
+def test_batch_mode_with_city_index(monkeypatch, capsys, tmp_path):
+    """With --city-index, batch mode should use the bulk lookup."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("paris\n"))
+    calls = [] # Records the cities and index passed to the bulk lookup
+    def fake_bulk(self, cities, index, max_workers=None):
+        """Return success for every city, recording the call."""
+        calls.append((cities, index.ids))
+        return [CityResult(city, {"city": city}, None) for city in cities]
+    monkeypatch.setattr(WeatherService, "get_weather_bulk", fake_bulk)
+    index_path = tmp_path / "index.json"
+    index_path.write_text('{"paris": 2988507}', encoding="utf-8")
+
+    assert main.main(["-c", "-", "--city-index", str(index_path)]) == 0
+    assert calls == [(["paris"], {"paris": 2988507})]
+    assert "OUTPUT: {'city': 'paris'}" in capsys.readouterr().out
+
+def test_start_warm_up(monkeypatch):
+    """The warm-up thread should load the timezone data and create the HTTP session."""
+
+    warmed = [] # Records what the warm-up thread touched
+    monkeypatch.setattr(main.dt_conversion, "warm_up", lambda: warmed.append("timezones"))
+    class FakeService:
+        """Records access to the session property."""
+        @property
+        def session(self):
+            """Record the session being created."""
+            warmed.append("session")
+
+    main.start_warm_up(FakeService()).join(timeout=5)
+    assert warmed == ["timezones", "session"]
+
+def test_stats_and_profile_flags(monkeypatch, capsys, tmp_path):
+    """--stats-json and --profile should write their reports when batch mode finishes."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch_weather)
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("paris\n"))
+    stats_path, profile_path = tmp_path / "stats.json", tmp_path / "run.prof"
+
+    try:
+        assert main.main(["-c", "-", "--stats-json", str(stats_path),
+                          "--profile", str(profile_path)]) == 0
+    finally:
+        main.instrumentation.disable()
+        main.instrumentation.reset()
+    assert "output.FakeOutputHandler" in json.loads(stats_path.read_text(encoding="utf-8"))
+    assert profile_path.stat().st_size > 0
+
+def test_rate_limit_flags(monkeypatch, capsys):
+    """--rate-limit and --daily-limit should give the service a shared limiter."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("paris\nrome\n"))
+    limiters = [] # Records the limiter used for each city
+    def fake_fetch(self, city):
+        """Take a call from the limiter like a real request would."""
+        self.rate_limiter.acquire()
+        limiters.append(self.rate_limiter)
+        return fake_fetch_weather(self, city)
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch)
+
+    try:
+        assert main.main(["-c", "-", "--rate-limit", "30", "--daily-limit", "1000",
+                          "--stats"]) == 0
+    finally:
+        main.instrumentation.disable()
+        main.instrumentation.reset()
+    assert len(limiters) == 2 and limiters[0] is limiters[1]
+    assert len(limiters[0]._buckets) == 2 # Minute and day budgets
+    assert "Rate limiter: {'acquired': 2" in capsys.readouterr().err
+
+def test_near_capital_names_are_sent(monkeypatch, capsys):
+    """Cities close to a capital's name should still be fetched, with a suggestion only on a 404."""
+
+    import requests # Used to build the 404 the API gives for an unknown city
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    fetched = [] # City names sent to the API
+    def fake_get_json(self, url, owm_queries):
+        """Return weather for real cities and a 404 for "londn"."""
+        fetched.append(owm_queries.get("q"))
+        if owm_queries.get("q") == "londn":
+            response = requests.Response()
+            response.status_code, response.reason = 404, "Not Found"
+            try:
+                raise requests.HTTPError(response=response)
+            except requests.HTTPError as e:
+                raise WeatherServiceError("HTTP Error: 404 - Not Found") from e
+        return MockOWMServer().weather_json(owm_queries.get("q", "London").title())
+    monkeypatch.setattr(WeatherService, "_get_json", fake_get_json)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("londn\nbergen\npanama\n"))
+
+    assert main.main(["-c", "-", "-w", "1"]) == 2
+    output = capsys.readouterr().out
+    assert fetched == ["londn", "bergen", "panama"] # Bergen isn't rejected as a typo of Bern
+    assert "OUTPUT: {'city': 'Bergen'" in output and "OUTPUT: {'city': 'Panama'" in output
+    assert "londn: HTTP Error: 404 - Not Found (did you mean London?)" in output
+
+    monkeypatch.setattr(sys, "stdin", io.StringIO("londn\n"))
+    assert main.main(["-c", "-", "--no-capitals"]) == 1
+    assert "londn: HTTP Error: 404 - Not Found\n" in capsys.readouterr().out # No suggestion
+
+def test_tee_writes_extra_sinks(monkeypatch, capsys, tmp_path):
+    """--tee should write every record to each extra output as well as the main one."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(WeatherService, "get_record", fake_fetch_weather)
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    monkeypatch.setattr(sys, "stdin", io.StringIO("paris\nrome\n"))
+    csv_file, jsonl_file = tmp_path / "out.csv", tmp_path / "out.jsonl"
+
+    assert main.main(["-c", "-", "--tee", f"csv={csv_file}", "--tee", f"jsonl={jsonl_file}"]) == 0
+    output = capsys.readouterr().out
+    assert "OUTPUT: {'city': 'paris'" in output and "OUTPUT: {'city': 'rome'" in output
+    assert len(csv_file.read_text(encoding="utf-8").splitlines()) == 3
+    assert len(jsonl_file.read_text(encoding="utf-8").splitlines()) == 2
+    with pytest.raises(SystemExit):
+        main.parse_args(["--tee", "xml=out.xml"])
+    with pytest.raises(SystemExit): # Worker processes write the output, nothing to tee
+        main.parse_args(["-c", "-", "-f", "csv", "--processes", "2", "--tee", "jsonl"])
+
+def test_cache_flag_serves_repeat_cities(monkeypatch, capsys, tmp_path):
+    """--cache FILE should serve a city fetched by an earlier run without calling the API."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(main, "TerminalOutput", FakeOutputHandler)
+    requested = [] # Cities that reached the API
+    def fake_fetch_record(self, city):
+        """Record the request and return a record for the city."""
+        requested.append(city)
+        return WeatherRecord(city, 20, 50, "sunny", 800, 1609459200, 51.5, -0.13)
+    monkeypatch.setattr(WeatherService, "fetch_record", fake_fetch_record)
+    cache_file = tmp_path / "cache.db"
+
+    for _ in range(2): # The second run is served from the cache file
+        monkeypatch.setattr(sys, "stdin", io.StringIO("paris\n"))
+        assert main.main(["-c", "-", "--cache", str(cache_file)]) == 0
+    assert requested == ["paris"]
+    assert capsys.readouterr().out.count("OUTPUT: {'city': 'paris'") == 2
+    assert main.parse_args(["--cache"]).cache == "" # No file keeps the cache in memory
+
+def test_missing_cities_file(monkeypatch, capsys, tmp_path):
+    """An unreadable --cities path should print an error and exit 1, not raise."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    missing = tmp_path / "missing.txt"
+
+    assert main.main(["--cities", str(missing)]) == 1
+    assert f"Error: Unable to read cities from {missing} (No such file or directory)" \
+        in capsys.readouterr().out
+    assert main.main(["--replay", str(tmp_path), "--cities", str(missing)]) == 1
+
+def test_interactive_csv_keeps_every_city(monkeypatch, capsys, tmp_path):
+    """The CSV menu choice should add each city to the file rather than overwrite it."""
+
+    out_file = tmp_path / "out.csv"
+    setup_test_env(monkeypatch, lambda self, city: fake_fetch_weather(self, city),
+                   ["2", str(out_file), "paris", "rome", "exit"])
+
+    with pytest.raises(SystemExit):
+        main.main()
+    lines = out_file.read_text(encoding="utf-8").splitlines()
+    assert [line.split(",")[0] for line in lines] == ["city", "paris", "rome"]
+
+def test_tee_kept_after_return(monkeypatch, capsys, tmp_path):
+    """Choosing a new output with "return" should keep writing to the --tee outputs."""
+
+    jsonl_file = tmp_path / "out.jsonl"
+    setup_test_env(monkeypatch, lambda self, city: fake_fetch_weather(self, city),
+                   ["1", "paris", "return", "1", "rome", "exit"])
+
+    with pytest.raises(SystemExit):
+        main.main(["--tee", f"jsonl={jsonl_file}"])
+    assert "OUTPUT: {'city': 'rome'" in capsys.readouterr().out
+    lines = jsonl_file.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["city"] for line in lines] == ["paris", "rome"]
@@ -0,0 +1,27 @@
+"""Tests mock_server.py, the local stand-in for the OpenWeatherMap API."""
+
+import requests
+from mock_server import MockOWMServer
+from weather_service import WeatherService
+
+def test_weather_and_group_endpoints():
+    """The mock should answer name and group lookups in the shapes WeatherService parses."""
+
+    with MockOWMServer() as server, WeatherService("KEY", retries=0) as ws:
+        ws.url, ws.group_url = server.weather_url, server.group_url
+        assert ws.get_weather_data("buenos aires")["city"] == "Buenos Aires"
+        group = requests.get(server.group_url, params={"id": "1,2,3"}, timeout=5).json()
+        assert [item["id"] for item in group["list"]] == [1, 2, 3]
+        assert server.requests["buenos aires"] == 1
+        assert server.total_requests() == 2
+
+def test_injected_errors_and_rate_limits():
+    """error_rate and rate_limit_rate of 1 should make every response fail that way."""
+
+    with MockOWMServer(rate_limit_rate=1.0, retry_after=7) as server:
+        response = requests.get(server.weather_url, params={"q": "x"}, timeout=5)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
+        server.rate_limit_rate, server.error_rate = 0.0, 1.0
+        assert requests.get(server.weather_url, params={"q": "x"}, timeout=5).status_code == 500
+        assert server.statuses == {429: 1, 500: 1}
@@ -0,0 +1,92 @@
+"""Tests pipeline.py, multi-process conversion and writing of raw payloads."""
+
+import csv
+import json
+import pytest
+import main
+from mock_server import MockOWMServer
+from pipeline import process_payloads, read_payloads
+from records import WeatherRecord
+from weather_service import WeatherService, WeatherServiceError
+
+PAYLOADS = [MockOWMServer().weather_json(f"City {i}") for i in range(23)]
+
+def expected_rows() -> list:
+    """Rows as the single process handlers would write them, with local time as a string."""
+    return [WeatherRecord.from_owm(payload).to_dict() for payload in PAYLOADS]
+
+def test_csv_parts_are_merged_in_order(tmp_path):
+    """Shards converted by different processes should merge into one CSV in input order."""
+
+    out_file = tmp_path / "out.csv"
+    assert process_payloads(PAYLOADS, str(out_file), "csv", workers=2, shard_size=5) == (23, 0)
+    with open(out_file, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    expected = [{key: str(value) for key, value in row.items()} for row in expected_rows()]
+    assert rows == expected
+    assert not [path for path in tmp_path.iterdir() if path != out_file] # Parts removed
+
+def test_jsonl_output_and_bad_payloads(tmp_path):
+    """Incomplete payloads should be counted and skipped, the rest written as JSON Lines."""
+
+    out_file = tmp_path / "out.jsonl"
+    payloads = PAYLOADS[:3] + [{"name": "Broken"}] + PAYLOADS[3:]
+    assert process_payloads(payloads, str(out_file), "jsonl", workers=2, shard_size=4) == (23, 1)
+    lines = out_file.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == expected_rows()
+
+def test_unsupported_format(tmp_path):
+    """Terminal output can't be written in parts."""
+    with pytest.raises(ValueError):
+        process_payloads(PAYLOADS, str(tmp_path / "out"), "terminal")
+
+def test_read_payloads(tmp_path):
+    """Payload files should hold one raw OWM object per line."""
+
+    path = tmp_path / "payloads.jsonl"
+    path.write_text("".join(json.dumps(p) + "\n" for p in PAYLOADS[:2]) + "\n", encoding="utf-8")
+    assert read_payloads(str(path)) == PAYLOADS[:2]
+
+def test_processes_flag(monkeypatch, capsys, tmp_path):
+    """--processes should fetch raw payloads and write them through the pipeline."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    fetched = [] # Cities requested from the API
+    def fake_fetch_payload(self, city):
+        """Return a mock payload, failing for the city "nowhere"."""
+        fetched.append(city)
+        if city == "nowhere":
+            raise WeatherServiceError("HTTP Error: 404 - Not Found")
+        return MockOWMServer().weather_json(city.title())
+    monkeypatch.setattr(WeatherService, "fetch_payload", fake_fetch_payload)
+    cities, out_file = tmp_path / "cities.txt", tmp_path / "out.csv"
+    cities.write_text("paris\nnowhere\nrome\nParis\n", encoding="utf-8")
+
+    assert main.main(["-c", str(cities), "-f", "csv", "-o", str(out_file),
+                      "--processes", "2"]) == 2
+    lines = out_file.read_text(encoding="utf-8").splitlines()
+    assert [line.split(",")[0] for line in lines] == ["city", "Paris", "Rome", "Paris"]
+    assert sorted(fetched) == ["nowhere", "paris", "rome"] # The repeat isn't fetched again
+    output = capsys.readouterr().out
+    assert "nowhere: HTTP Error: 404 - Not Found" in output
+    assert f"Weather data written to {out_file} (3 records)" in output
+    for flag in (["--watch"], ["--city-index", "index.json"]): # Would be silently ignored
+        with pytest.raises(SystemExit):
+            main.parse_args(["-c", "-", "-f", "csv", "--processes", "2", *flag])
+
+def test_workers_open_their_own_finder(tmp_path):
+    """Workers forked after the parent used its finder should still convert every row correctly."""
+
+    import dt_conversion
+    dt_conversion.get_finder() # Open the finder's files in the parent before forking
+    payloads = []
+    for i in range(3000): # Distinct coordinates so every worker searches the polygons
+        payload = MockOWMServer().weather_json(f"City {i}")
+        payload["coord"] = {"lat": -55 + (i * 0.037) % 120, "lon": -179 + (i * 0.113) % 358}
+        payloads.append(payload)
+    out_file = tmp_path / "out.jsonl"
+
+    assert process_payloads(payloads, str(out_file), "jsonl", workers=4, shard_size=250) == (3000, 0)
+    lines = out_file.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == \
+        [WeatherRecord.from_owm(payload).to_dict() for payload in payloads]
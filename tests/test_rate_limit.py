@@ -0,0 +1,97 @@
+"""Tests rate_limit.py and the rate limited WeatherService path."""
+
+import threading
+import time
+from mock_server import MockOWMServer
+from rate_limit import RateLimiter, parse_retry_after
+from weather_service import WeatherService
+
+def test_burst_then_refill_rate():
+    """The burst should go through at once, further calls should wait for refills."""
+
+    limiter = RateLimiter(per_minute=602, burst=2) # Refills 10 tokens a second after the burst
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+    assert 0.15 <= elapsed < 1.0 # Two calls waited ~0.1s each
+    stats = limiter.stats()
+    assert stats["acquired"] == 4
+    assert stats["waiting"] == 0
+    assert stats["max_wait_s"] > 0.05
+
+def test_threads_share_one_budget():
+    """Calls from many threads should be queued against the same bucket, not fail."""
+
+    limiter = RateLimiter(per_minute=1201, burst=1) # 20 calls a second after the first
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(6)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 0.2 # Five calls spaced 50ms apart
+    stats = limiter.stats()
+    assert stats["acquired"] == 6
+    assert stats["max_waiting"] > 1 # Threads were queued at the same time
+
+def test_daily_limit_caps_calls():
+    """The per-day bucket should hold calls back even when the minute budget allows them."""
+
+    limiter = RateLimiter(per_minute=600, per_day=24, burst=5)
+    with limiter._lock:
+        assert limiter._try_acquire(time.monotonic()) == 0
+        assert limiter._try_acquire(time.monotonic()) > 60 # Day burst of 1 used, refill is slow
+
+def test_pause_holds_back_callers():
+    """pause should delay the next call and be counted."""
+
+    limiter = RateLimiter(per_minute=600)
+    limiter.pause(0.2)
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.15
+    assert limiter.stats()["pauses"] == 1
+
+def test_parse_retry_after():
+    """Seconds and HTTP dates should both be read, anything else gives the default."""
+
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) == 1.0
+    assert parse_retry_after("soon", default=2.0) == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0 # Already passed
+
+def test_service_waits_out_429_instead_of_failing():
+    """A 429 should pause the limiter for Retry-After and the call should then succeed."""
+
+    with MockOWMServer(rate_limit_rate=1.0, retry_after=1) as server, \
+            WeatherService("KEY", rate_limiter=RateLimiter(per_minute=600)) as ws:
+        ws.url = server.weather_url
+        timer = threading.Timer(0.2, setattr, (server, "rate_limit_rate", 0.0))
+        timer.start() # Stop answering 429 during the one second pause
+        assert ws.get_weather_data("london")["city"] == "London"
+        assert server.statuses == {429: 1, 200: 1}
+        assert ws.rate_limiter.stats()["pauses"] == 1
+
+def test_service_gives_up_after_rate_limit_retries(capsys):
+    """Persistent 429s should fail with an HTTP error once the retries are used up."""
+
+    with MockOWMServer(rate_limit_rate=1.0, retry_after=0) as server, \
+            WeatherService("KEY", rate_limiter=RateLimiter(per_minute=6000),
+                           rate_limit_retries=2) as ws:
+        ws.url = server.weather_url
+        assert ws.get_weather_data("london") == {}
+        assert server.statuses[429] == 3 # First call plus two retries, urllib3 didn't retry
+        assert "HTTP Error: 429" in capsys.readouterr().out
+
+def test_server_error_retries_take_from_the_budget(capsys):
+    """With a limiter, every retry of a 5xx should be a counted call, not a hidden urllib3 retry."""
+
+    with MockOWMServer(error_rate=1.0) as server, \
+            WeatherService("KEY", retries=3, backoff_factor=0,
+                           rate_limiter=RateLimiter(per_minute=600)) as ws:
+        ws.url = server.weather_url
+        assert ws.get_weather_data("london") == {}
+        assert server.total_requests() == 4 # First call plus three retries
+        assert ws.rate_limiter.stats()["acquired"] == server.total_requests()
+    assert "HTTP Error: 500" in capsys.readouterr().out
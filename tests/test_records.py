@@ -0,0 +1,45 @@
+"""Tests records.py module."""
+
+import dataclasses
+import pytest
+import records
+from records import WeatherRecord, as_dict
+from handlers import TerminalOutput
+
+OWM_ITEM = {
+    "coord": {"lon": 0, "lat": 0},
+    "weather": [{"id": 800, "main": "Clear", "description": "clear sky"}],
+    "main": {"temp": 22.5, "humidity": 55},
+    "dt": 1609459200,
+    "name": "TestCity"
+}
+
+def test_from_owm_and_to_dict(monkeypatch):
+    """Records should keep raw values and only format local time when converted."""
+
+    calls = [] # Records each local time conversion
+    monkeypatch.setattr(records, "convert_time",
+                        lambda dt, coords: calls.append((dt, coords)) or "01-Jan-21 12:00 AM UTC")
+    record = WeatherRecord.from_owm(OWM_ITEM)
+    assert (record.temperature, record.condition_code, record.dt) == (22.5, 800, 1609459200)
+    assert not calls, "Local time shouldn't be formatted until output"
+
+    assert record.to_dict() == {"city": "TestCity", "temperature": 22.5, "humidity": 55,
+                                "condition": "clear sky", "local_time": "01-Jan-21 12:00 AM UTC"}
+    assert calls == [(1609459200, {"lat": 0, "lon": 0})]
+
+def test_record_is_slotted_and_frozen():
+    """Records shouldn't carry a per-instance __dict__ and shouldn't be modifiable."""
+
+    record = WeatherRecord.from_owm(OWM_ITEM)
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        record.temperature = 0
+
+def test_handlers_accept_records(capsys):
+    """Output handlers should accept a WeatherRecord the same as a dict."""
+
+    record = WeatherRecord.from_owm(OWM_ITEM)
+    assert as_dict({"city": "x"}) == {"city": "x"}
+    TerminalOutput().output(record)
+    assert "Location: TestCity" in capsys.readouterr().out
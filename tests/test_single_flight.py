@@ -0,0 +1,69 @@
+"""Tests single_flight.py and request coalescing in WeatherService against the mock server."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from mock_server import MockOWMServer
+from single_flight import SingleFlight
+from weather_service import AsyncWeatherService, WeatherService, WeatherServiceError
+
+def test_concurrent_identical_lookups_make_one_request():
+    """N threads asking for the same city at once should trigger exactly one upstream request."""
+
+    with MockOWMServer(latency=0.2) as server, WeatherService("KEY", pool_size=10) as ws:
+        ws.url = server.weather_url
+        queries = ["london,gb", "London, GB", "LONDON  gb"] * 4 # Same normalised query
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            results = list(pool.map(ws.fetch_weather, queries))
+        assert server.total_requests() == 1
+        assert all(result == results[0] for result in results)
+        assert ws.in_flight.calls == 1
+        assert ws.in_flight.shared == len(queries) - 1
+
+def test_concurrent_raw_lookups_make_one_request():
+    """Raw payload lookups, used by the pipeline, should be coalesced too."""
+
+    with MockOWMServer(latency=0.2) as server, WeatherService("KEY", pool_size=5) as ws:
+        ws.url = server.weather_url
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            payloads = list(pool.map(ws.get_payload, ["oslo", "Oslo", "OSLO", "oslo", "oslo"]))
+        assert server.total_requests() == 1
+        assert all(payload["name"] == "Oslo" for payload in payloads)
+
+def test_concurrent_callers_share_the_error():
+    """Every waiting caller should get the failed request's error, and the next call retries."""
+
+    with MockOWMServer(latency=0.2, error_rate=1.0) as server, \
+            WeatherService("KEY", pool_size=5, retries=0) as ws:
+        ws.url = server.weather_url
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(ws.get_weather_many, [["paris"]] * 5))
+        assert server.total_requests() == 1
+        assert all(result[0].error == "HTTP Error: 500 - Internal Server Error"
+                   for result in results)
+        with pytest.raises(WeatherServiceError): # Not in flight any more, so a new request
+            ws.fetch_weather("paris")
+        assert server.total_requests() == 2
+
+def test_async_identical_lookups_make_one_request():
+    """Concurrent tasks for the same city should trigger one request, other cities their own."""
+
+    async def fetch_all(url):
+        """Fetch duplicates of two cities concurrently."""
+        async with AsyncWeatherService("KEY", concurrency=4) as service:
+            service.service.url = url
+            return await service.get_weather_many(["rome", "Rome", "lima", "rome", "LIMA"])
+
+    with MockOWMServer(latency=0.2) as server:
+        results = asyncio.run(fetch_all(server.weather_url))
+        assert [result.data.city for result in results] == ["Rome", "Rome", "Lima", "Rome", "Lima"]
+        assert server.requests == {"rome": 1, "lima": 1}
+
+def test_sequential_calls_are_not_coalesced():
+    """Only calls overlapping in time should share a result."""
+
+    flight = SingleFlight()
+    values = iter([1, 2])
+    assert flight.do("key", next, values) == 1
+    assert flight.do("key", next, values) == 2
+    assert (flight.calls, flight.shared) == (2, 0)
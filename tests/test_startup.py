@@ -0,0 +1,31 @@
+"""Import time regression test for the CLI, run in a fresh interpreter with -X importtime."""
+
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+IMPORT_BUDGET_US = 150_000 # Importing main took ~250ms before imports were deferred, ~40ms after
+HEAVY_MODULES = {"requests", "urllib3", "pytz", "timezonefinder", "numpy", "h3", "dotenv",
+                 "sqlite3", "asyncio"}
+
+def import_times(module: str) -> dict:
+    """Import the module in a new interpreter, returning {module name: cumulative microseconds}."""
+
+    env = dict(os.environ, PYTHONPATH=SRC)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines(): # "import time: self [us] | cumulative | name"
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+def test_main_defers_heavy_imports():
+    """Importing main shouldn't import HTTP, timezone or NumPy libraries, and should be quick."""
+
+    times = import_times("main")
+    assert not HEAVY_MODULES & set(times), "Heavy modules should load on first use, not import"
+    assert times["main"] < IMPORT_BUDGET_US, f"Importing main took {times['main']}us"
@@ -0,0 +1,51 @@
+"""Tests store.py module."""
+
+import numpy as np
+from records import WeatherRecord
+from store import WeatherStore
+
+def record(city, dt, temperature, humidity=50, code=800):
+    """Build a WeatherRecord with only the fields the store keeps varying."""
+    return WeatherRecord(city, temperature, humidity, "clear sky", code, dt, 0.0, 0.0)
+
+def test_append_grows_and_summarises():
+    """The store should grow past its capacity and summarise each city in the time window."""
+
+    store = WeatherStore(capacity=2)
+    store.extend([record("London", 100, 10.0), record("Paris", 100, 20.0)])
+    store.append(record("London", 200, 14.0))
+    store.append(record("London", 300, 30.0)) # Outside the window below
+    store.append(record("Paris", 200, 22.0))
+
+    assert len(store) == 5
+    assert store.summary(start=100, end=300) == {
+        "London": (10.0, 14.0, 12.0, 2),
+        "Paris": (20.0, 22.0, 21.0, 2)
+    }
+    assert store.summary(start=1000) == {}
+    assert store.summary(field="humidity")["London"] == (50.0, 50.0, 50.0, 3)
+
+def test_latest():
+    """latest should give each city's most recent observation."""
+
+    store = WeatherStore()
+    store.extend([record("Rome", 300, 5.0), record("Rome", 100, 1.0), record("Oslo", 200, -3.0)])
+    latest = store.latest()
+    assert latest["Rome"]["dt"] == 300
+    assert latest["Oslo"]["temperature"] == np.float32(-3.0)
+
+def test_save_and_memory_mapped_load(tmp_path):
+    """A saved store should reopen memory mapped and copy itself out on the next append."""
+
+    store = WeatherStore()
+    store.extend([record("Lima", 100, 18.0, code=500), record("Quito", 100, 12.0)])
+    store.save(tmp_path)
+
+    loaded = WeatherStore.load(tmp_path)
+    assert isinstance(loaded.data.base, np.memmap) or isinstance(loaded.data, np.memmap)
+    assert loaded.cities == ["Lima", "Quito"]
+    assert loaded.data["condition_code"].tolist() == [500, 800]
+
+    loaded.append(record("Lima", 200, 20.0))
+    assert loaded.summary()["Lima"] == (18.0, 20.0, 19.0, 2)
+    assert len(WeatherStore.load(tmp_path)) == 2, "The saved file shouldn't change"
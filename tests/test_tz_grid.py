@@ -0,0 +1,52 @@
+"""Tests tz_grid.py module and its use by dt_conversion."""
+
+import numpy as np
+import dt_conversion as dtc
+from tz_grid import TimezoneGrid
+
+class SplitFinder:
+    """Dummy TimezoneFinder with a border at longitude 0."""
+
+    def __init__(self):
+        """Start counting lookups."""
+        self.calls = 0
+
+    def timezone_at(self, lat, lng):
+        """Return Europe/London west of 0 and Europe/Paris east of it."""
+        self.calls += 1
+        return "Europe/London" if lng < 0 else "Europe/Paris"
+
+def test_build_skips_border_cells():
+    """Cells inside one timezone should be kept, cells crossing the border left out."""
+
+    grid = TimezoneGrid.build([(51.5, -2.0), (51.5, 0.0)], SplitFinder(), resolution=5, ring=1)
+    assert grid.lookup(51.5, -2.0) == "Europe/London"
+    assert grid.lookup(51.5, 0.0) is None, "Cell on the border should fall back"
+    assert grid.lookup(-33.9, 151.2) is None, "Cells far from any point aren't covered"
+
+def test_save_load_round_trip(tmp_path):
+    """A saved grid should load with the same cells."""
+
+    grid = TimezoneGrid.build([(48.85, 2.35)], SplitFinder(), resolution=4, ring=2)
+    grid.save(tmp_path / "grid")
+    loaded = TimezoneGrid.load(tmp_path / "grid")
+    assert loaded.to_dict() == grid.to_dict()
+    assert loaded.resolution == 4
+    assert isinstance(loaded.cells, np.memmap), "Arrays should be mapped, not read"
+    assert loaded.lookup(48.85, 2.35) == grid.lookup(48.85, 2.35) == "Europe/Paris"
+
+def test_get_timezone_uses_grid_then_finder(monkeypatch, tmp_path):
+    """get_timezone should answer from the grid and only ask the finder for uncovered cells."""
+
+    grid = TimezoneGrid.build([(51.5, -2.0)], SplitFinder(), resolution=5, ring=0)
+    grid.save(tmp_path / "grid")
+    finder = SplitFinder()
+    monkeypatch.setattr(dtc, "_finder", finder)
+    dtc.use_timezone_grid(tmp_path / "grid")
+    try:
+        assert dtc.get_timezone({"lat": 51.5, "lon": -2.0}) == "Europe/London"
+        assert finder.calls == 0
+        assert dtc.get_timezone({"lat": 48.85, "lon": 2.35}) == "Europe/Paris"
+        assert finder.calls == 1
+    finally:
+        dtc.use_timezone_grid(None) # Don't leak the grid into other tests
@@ -0,0 +1,87 @@
+"""Tests watcher.py, the polling watch mode."""
+
+import os
+import signal
+import threading
+import pytest
+import main
+import records
+from handlers import DataOutput
+from records import WeatherRecord
+from watcher import WeatherWatcher
+from weather_service import WeatherService, WeatherServiceError
+
+class ListOutput(DataOutput):
+    """Collects output records in a list."""
+
+    def __init__(self):
+        """Start with nothing output."""
+        super().__init__()
+        self.records = []
+
+    def output(self, data):
+        """Keep the record."""
+        self.records.append(data)
+
+class FakeService:
+    """Returns a queued (dt, temperature) reading, or error, for each poll."""
+
+    def __init__(self, readings):
+        """Store the readings to return in order."""
+        self.readings = iter(readings)
+
+    def fetch_record(self, city):
+        """Return the next reading as a WeatherRecord."""
+        reading = next(self.readings)
+        if isinstance(reading, Exception):
+            raise reading
+        dt, temperature = reading
+        return WeatherRecord(city, temperature, 50, "clear sky", 800, dt, 0.0, 0.0)
+
+def test_only_new_and_changed_observations_are_output(monkeypatch, capsys):
+    """Polls with an old dt or the same weather shouldn't reach the handler."""
+
+    monkeypatch.setattr(records, "convert_time", lambda dt, coords: str(dt))
+    service = FakeService([(100, 20.0), (100, 20.0), WeatherServiceError("Network Error: down"),
+                           (200, 21.0), (300, 21.0)])
+    handler = ListOutput()
+    # Old dts put every next poll in the past, so retry_interval=0 polls each round
+    watcher = WeatherWatcher(service, handler, ["paris"], retry_interval=0, max_workers=1)
+    watcher.run(max_cycles=5)
+
+    assert [(r["local_time"], r["temperature"]) for r in handler.records] == \
+        [("100", 20.0), ("200", 21.0)]
+    assert watcher.stats() == {"polls": 5, "emitted": 2, "stale": 1, "unchanged": 1, "errors": 1}
+    assert "paris: Network Error: down" in capsys.readouterr().out
+
+def test_next_poll_is_aligned_to_dt():
+    """The next poll should follow the expected publish time, or retry if it has passed."""
+
+    watcher = WeatherWatcher(None, None, [], update_interval=600, update_lag=30,
+                             retry_interval=60)
+    assert watcher.next_poll(dt=1000, now=1100) == 1630
+    assert watcher.next_poll(dt=1000, now=2000) == 2060
+
+def test_watch_mode_stops_on_sigterm(monkeypatch, capsys, tmp_path):
+    """SIGTERM should end the watch loop and close the output file with exit code 0."""
+
+    monkeypatch.setenv("OWM_API_KEY", "TEST_KEY")
+    monkeypatch.setattr(records, "convert_time", lambda dt, coords: "01-Jan-21 12:00 AM UTC")
+    monkeypatch.setattr(WeatherService, "fetch_record",
+                        lambda self, city: WeatherRecord(city, 20.0, 50, "clear sky", 800,
+                                                         1609459200, 0.0, 0.0))
+    cities, out_file = tmp_path / "cities.txt", tmp_path / "out.csv"
+    cities.write_text("paris\nrome\n", encoding="utf-8")
+    threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGTERM)).start()
+
+    assert main.main(["-c", str(cities), "--watch", "-f", "csv", "-o", str(out_file)]) == 0
+    assert len(out_file.read_text(encoding="utf-8").splitlines()) == 3 # Header and two cities
+    assert "'emitted': 2" in capsys.readouterr().err
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL # Handler restored
+
+def test_watch_needs_cities(capsys):
+    """--watch without a city list should be rejected."""
+
+    with pytest.raises(SystemExit):
+        main.parse_args(["--watch"])
+    assert "--watch needs a city list" in capsys.readouterr().err
@@ -1,7 +1,15 @@
 """Tests weather_service.py module using pytest and requests-mock."""
 
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
 import requests
-from weather_service import WeatherService
+from city_index import CityIndex
+from weather_service import AsyncWeatherService, WeatherService
 import dt_conversion
 
 def test_get_weather_data_success(requests_mock, monkeypatch):
@@ -105,16 +113,16 @@ def test_get_weather_data_http_error(requests_mock, capsys):
 def test_get_weather_data_generic_exception(monkeypatch, capsys):
     """Test handling of an unexpected request exception when retrieving weather data."""
 
-    # Patch requests.get to raise a raw RequestException (not HTTPError, Timeout, etc.)
+    # Patch session.get to raise a raw RequestException (not HTTPError, Timeout, etc.)
     def raise_req_exception(*args, **kwargs):
         """Function to raise a RequestException for testing purposes."""
 
         raise requests.RequestException("test error") # Simulate a generic request exception
 
-    # Replace requests.get with our function that raises an exception
-    monkeypatch.setattr(requests, "get", raise_req_exception)
-
     ws = WeatherService(api_key="KEY") # Create instance of WeatherService with a fake API key
+    # Replace the session's get with our function that raises an exception
+    monkeypatch.setattr(ws.session, "get", raise_req_exception)
+
     result = ws.get_weather_data("City") # Call the method to get weather data for "City"
     captured = capsys.readouterr() # Capture printed output
 
@@ -149,3 +157,212 @@ def test_get_weather_data_key_error(requests_mock, capsys, monkeypatch):
     # Assert that the result is an empty dictionary and the correct error message is printed
     assert result == {} 
     assert "Data Error: Missing expected field" in captured.out
+
+
+FAKE_OWM = {
+    "coord": {"lon": 0, "lat": 0},
+    "weather": [{"main": "Clear", "description": "clear sky"}],
+    "main": {"temp": 22.5, "humidity": 55},
+    "dt": 1609459200,
+    "name": "TestCity",
+    "cod": 200
+}
+
+@pytest.fixture
+def local_server():
+    """Runs a keep-alive HTTP server on localhost that records each request's client port.
+
+    Set server.statuses to a list of status codes to return in order (last one repeats),
+    server.city_statuses to fix the status for a city and server.delays to slow cities down.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        """Serves FAKE_OWM or the next configured error status."""
+        protocol_version = "HTTP/1.1" # Needed for keep-alive connections
+
+        def do_GET(self): # Name required by BaseHTTPRequestHandler
+            """Record the client port and send the next response."""
+            server.ports.append(self.client_address[1])
+            city = parse_qs(urlparse(self.path).query)["q"][0]
+            time.sleep(server.delays.get(city, 0))
+            status = server.statuses.pop(0) if len(server.statuses) > 1 else server.statuses[0]
+            status = server.city_statuses.get(city, status)
+            body = json.dumps(dict(FAKE_OWM, name=city) if status == 200 else {"cod": status})
+            body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): # Keep pytest output clean
+            """Silence request logging."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.ports = [] # Client port of each request, same port means same connection
+    server.statuses = [200]
+    server.city_statuses = {}
+    server.delays = {}
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_session_reuses_connection(local_server):
+    """Repeated lookups should reuse one pooled keep-alive connection."""
+
+    with WeatherService(api_key="KEY") as ws:
+        ws.url = f"http://127.0.0.1:{local_server.server_port}/data/2.5/weather"
+        for _ in range(3):
+            assert ws.get_weather_data("TestCity")["city"] == "TestCity"
+
+    assert len(local_server.ports) == 3
+    assert len(set(local_server.ports)) == 1, "All requests should share one connection"
+
+
+def test_retries_stop_at_cap(local_server, capsys):
+    """Server errors should be retried up to the configured cap and then reported."""
+
+    local_server.statuses = [503]
+    with WeatherService(api_key="KEY", retries=2, backoff_factor=0) as ws:
+        ws.url = f"http://127.0.0.1:{local_server.server_port}/data/2.5/weather"
+        result = ws.get_weather_data("TestCity")
+
+    assert result == {}
+    assert len(local_server.ports) == 3, "One request plus two retries"
+    assert "HTTP Error: 503" in capsys.readouterr().out
+
+
+def test_retry_recovers_after_429(local_server):
+    """A 429 followed by success should return the data."""
+
+    local_server.statuses = [429, 200]
+    with WeatherService(api_key="KEY", retries=2, backoff_factor=0) as ws:
+        ws.url = f"http://127.0.0.1:{local_server.server_port}/data/2.5/weather"
+        assert ws.get_weather_data("TestCity")["city"] == "TestCity"
+    assert len(local_server.ports) == 2
+
+
+def test_session_is_used_and_closed(requests_mock):
+    """Lookups should go through the service's session, which closes with the context manager."""
+
+    requests_mock.get("https://api.openweathermap.org/data/2.5/weather", json=FAKE_OWM)
+    with WeatherService(api_key="KEY", pool_size=4, retries=5) as ws:
+        ws.get_weather_data("TestCity")
+        ws.get_weather_data("TestCity")
+        adapter = ws.session.adapters["https://"]
+        closed = []
+        adapter.close = lambda: closed.append(True) # Record the pool being closed
+
+    assert requests_mock.call_count == 2
+    assert adapter.max_retries.total == 5
+    assert adapter._pool_maxsize == 4
+    assert closed, "Leaving the with block should close the pool"
+
+
+def test_get_weather_many_order_errors_and_concurrency(local_server):
+    """Many city lookups should run in parallel, keep input order and report errors per city."""
+
+    # Sleep so cities would finish out of order if results weren't reordered
+    local_server.delays = {"a": 0.3, "b": 0.1, "bad": 0.2, "c": 0.2}
+    local_server.city_statuses = {"bad": 404}
+    cities = ["a", "b", "bad", "c"]
+    with WeatherService(api_key="KEY") as ws:
+        ws.url = f"http://127.0.0.1:{local_server.server_port}/data/2.5/weather"
+        start = time.perf_counter()
+        results = ws.get_weather_many(cities, max_workers=4)
+        elapsed = time.perf_counter() - start
+
+    assert [r.city for r in results] == cities
+    assert [r.data and r.data.city for r in results] == ["a", "b", None, "c"]
+    assert results[2].error == "HTTP Error: 404 - Not Found"
+    assert all(r.error is None for i, r in enumerate(results) if i != 2)
+    assert elapsed < 0.6, "Lookups should overlap, taking about as long as the slowest"
+
+
+def test_async_weather_service_get_weather_many(requests_mock, capsys):
+    """The asyncio variant should return results in input order with per-city errors."""
+
+    def respond(request, context):
+        """Return data for every city except 'bad'."""
+        city = request.qs["q"][0]
+        if city == "bad":
+            context.status_code = 404
+            context.reason = "Not Found"
+            return {"cod": "404"}
+        return dict(FAKE_OWM, name=city)
+
+    requests_mock.get("https://api.openweathermap.org/data/2.5/weather", json=respond)
+
+    async def run():
+        """Fetch several cities, then a single failing one."""
+        async with AsyncWeatherService(api_key="KEY", concurrency=2) as service:
+            many = await service.get_weather_many(["x", "bad", "y"])
+            single = await service.get_weather_data("bad")
+        return many, single
+
+    many, single = asyncio.run(run())
+    assert [r.data and r.data.city for r in many] == ["x", None, "y"]
+    assert many[1].error == "HTTP Error: 404 - Not Found"
+    assert single == {}
+    assert "HTTP Error: 404 - Not Found" in capsys.readouterr().out
+
+
+def test_get_weather_bulk_uses_group_endpoint(requests_mock):
+    """Resolved cities should be fetched 20 IDs per request, others by name, in input order."""
+
+    def group(request, context):
+        """Return a weather object for every requested ID except 13."""
+        ids = [int(i) for i in request.qs["id"][0].split(",")]
+        return {"cnt": len(ids), "list": [dict(FAKE_OWM, id=i, name=f"city{i}")
+                                          for i in ids if i != 13]}
+
+    group_mock = requests_mock.get("https://api.openweathermap.org/data/2.5/group", json=group)
+    single_mock = requests_mock.get("https://api.openweathermap.org/data/2.5/weather",
+                                    json=dict(FAKE_OWM, name="Unknown"))
+    index = CityIndex({f"city{i}": i for i in range(25)})
+    cities = [f"city{i}" for i in range(25)] + ["unknown", "city3"]
+
+    with WeatherService(api_key="KEY") as ws:
+        results = ws.get_weather_bulk(cities, index)
+
+    assert group_mock.call_count == 2, "25 IDs should take two group requests"
+    assert single_mock.call_count == 1, "Only the unresolved city is looked up by name"
+    assert [r.city for r in results] == cities
+    assert results[0].data.city == "city0"
+    assert results[13].error == "Data Error: No data returned for city id 13"
+    assert results[25].data.city == "Unknown"
+    assert results[26].data.city == "city3"
+
+
+def test_get_weather_bulk_group_error(requests_mock):
+    """A failed group request should report the error for each city in it."""
+
+    requests_mock.get("https://api.openweathermap.org/data/2.5/group",
+                      status_code=401, reason="Unauthorized")
+    with WeatherService(api_key="KEY") as ws:
+        results = ws.get_weather_bulk(["a", "b"], CityIndex({"a": 1, "b": 2}))
+    assert [r.error for r in results] == ["HTTP Error: 401 - Unauthorized"] * 2
+
+
+def test_many_and_bulk_return_unformatted_records(requests_mock, monkeypatch):
+    """Multi-city lookups should return WeatherRecords, formatting local time only on output."""
+
+    import records
+    from records import WeatherRecord
+    formatted = [] # Timestamps formatted so far
+    monkeypatch.setattr(records, "convert_time", lambda dt, coords: formatted.append(dt) or "now")
+    requests_mock.get("https://api.openweathermap.org/data/2.5/weather",
+                      json=dict(FAKE_OWM, name="Rome"))
+    requests_mock.get("https://api.openweathermap.org/data/2.5/group",
+                      json={"cnt": 1, "list": [dict(FAKE_OWM, id=1, name="Lima")]})
+    with WeatherService(api_key="KEY") as ws:
+        many = ws.get_weather_many(["rome"])
+        bulk = ws.get_weather_bulk(["lima"], CityIndex({"lima": 1}))
+        assert ws.get_weather_data("rome")["local_time"] == "now" # Still a dict
+
+    assert all(isinstance(r.data, WeatherRecord) for r in many + bulk)
+    assert len(formatted) == 1, "Only get_weather_data formats local time"
+    assert many[0].data.to_dict()["local_time"] == "now"